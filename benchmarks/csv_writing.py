@@ -0,0 +1,85 @@
+"""
+Compares writing a synthetic converted table with to_csv(), as the
+pipeline used to, with the CSV writer of the converted tables, and checks
+that both write the same bytes.
+
+Run from the repository's root:
+
+    python benchmarks/csv_writing.py --rows 1000000
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+from csv_writer import write_csv  # noqa: E402
+from formats import all_columns  # noqa: E402
+
+
+def make_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Returns a table like the converted ones, with amounts of various
+    magnitudes and a few missing values.
+    """
+    rng = np.random.default_rng(seed)
+
+    def amounts(scale):
+        values = np.round(rng.random(rows) * scale, 8)
+        values[rng.random(rows) < 0.01] = np.nan
+        return values
+
+    def choices(*values):
+        return np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+
+    dates = pd.Timestamp("2015-01-01") + pd.to_timedelta(
+        np.sort(rng.integers(0, 5 * 365 * 86400, rows)), unit="s"
+    )
+    return pd.DataFrame(
+        {
+            "Date": dates.strftime("%Y-%m-%d %H:%M:%S +0000"),
+            "Action": choices("BUY", "SELL"),
+            "Symbol": choices("BTC", "ETH", "LTC", "XRP", "ZEC"),
+            "Volume": amounts(100),
+            "Currency": choices("USD", "EUR", "ILS", "BTC"),
+            "Account": choices("Kraken", "Bitfinex", np.nan),
+            "Total": amounts(1e5),
+            "Price": amounts(1e4),
+            "Fee": amounts(1),
+            "FeeCurrency": choices("USD", "EUR", "BTC"),
+        },
+        columns=all_columns,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    data = make_table(args.rows)
+    with tempfile.TemporaryDirectory() as directory:
+        before_fname = pathlib.Path(directory) / "to_csv.csv"
+        after_fname = pathlib.Path(directory) / "write_csv.csv"
+        start = time.perf_counter()
+        data.to_csv(before_fname, header=False, index=False, float_format="%f")
+        before = time.perf_counter() - start
+        start = time.perf_counter()
+        write_csv(data, after_fname)
+        after = time.perf_counter() - start
+        identical = before_fname.read_bytes() == after_fname.read_bytes()
+        size = after_fname.stat().st_size
+    print(f"{args.rows} rows, {size / 2 ** 20:.1f} MiB")
+    print(f"to_csv:    {before:.2f}s")
+    print(f"write_csv: {after:.2f}s ({before / after:.1f}x)")
+    print(f"identical: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares reading a scaled-up Bit2c workbook with pd.read_excel(), with
+the streaming .xlsx reader and from the sheet cache.
+
+Run from the repository's root:
+
+    python benchmarks/excel_cache.py --scale 300
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+import pipeline  # noqa: E402
+import xlsx_reader  # noqa: E402
+from sheet_cache import SheetCache  # noqa: E402
+
+
+EXAMPLE = (
+    pathlib.Path(__file__).resolve().parents[1]
+    / "examples"
+    / "bit2c-financial-report-2018.xlsx"
+)
+
+
+def write_workbook(fname: pathlib.Path, data: pd.DataFrame, scale: int):
+    """Writes the data scale times over, much faster than to_excel()."""
+    from openpyxl import Workbook
+
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet()
+    sheet.append(list(data.columns))
+    rows = [
+        [None if pd.isna(value) else value for value in row]
+        for row in data.astype(object).itertuples(index=False)
+    ]
+    for _ in range(scale):
+        for row in rows:
+            sheet.append(row)
+    book.save(fname)
+
+
+def measure(read, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = read()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        fname = pathlib.Path(directory) / EXAMPLE.name
+        write_workbook(fname, pd.read_excel(EXAMPLE), args.scale)
+        usecols, dtypes, _ = pipeline._read_schema(pipeline.sniff_format(fname))
+        cache = SheetCache(pathlib.Path(directory) / "cache")
+        results = {
+            "pd.read_excel": measure(
+                lambda: pd.read_excel(fname, usecols=usecols, dtype=dtypes), 1
+            ),
+            "streaming reader": measure(
+                lambda: xlsx_reader.read_sheet(fname, usecols, dtypes), 1
+            ),
+            "first read, cached": measure(
+                lambda: pipeline.read_excel(fname, usecols, dtypes, cache), 1
+            ),
+            "cache hit": measure(
+                lambda: pipeline.read_excel(fname, usecols, dtypes, cache),
+                args.repeat,
+            ),
+        }
+    expected = results["pd.read_excel"][1]
+    print(f"{len(expected)} rows")
+    for name, (elapsed, data) in results.items():
+        pd.testing.assert_frame_equal(expected, data)
+        print(f"{name + ':':<20}{elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
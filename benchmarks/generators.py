@@ -0,0 +1,514 @@
+"""
+Generators of synthetic exports in every supported format.
+
+Each generator is keyed by the name of its format's signature in
+formats.py and returns a table with exactly the signature's columns, whose
+values look like the exchange's own exports: trades in a handful of
+markets with log-uniformly spread amounts, timestamps in the exchange's
+layout, and some rows of other kinds (deposits, withdrawals, fees) which
+the pipeline filters out.
+
+    python benchmarks/generators.py lqui0 100000 lqui.csv
+"""
+import argparse
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+import formats  # noqa: E402
+
+
+START = pd.Timestamp("2017-01-01")
+DAYS = 730
+ISO_LAYOUT = "%Y-%m-%d %H:%M:%S"
+US_LAYOUT = "%m/%d/%Y %I:%M:%S %p"
+MARKETS = [
+    ("ETH", "BTC", 0.03),
+    ("LTC", "BTC", 0.01),
+    ("XRP", "BTC", 0.00005),
+    ("ZEC", "BTC", 0.02),
+    ("BTC", "USD", 8000.0),
+    ("ETH", "USD", 300.0),
+]
+BIT2C_COINS = [("BTC", 30000.0), ("ETH", 1000.0), ("LTC", 300.0)]
+CEX_COINS = [("BTC", 8000.0), ("ETH", 300.0), ("LTC", 60.0)]
+# Formats which are exported as Excel workbooks
+EXCEL_FORMATS = {"binance0", "bit2c0", "bit2c1", "bit2c2", "trades0"}
+
+
+def dates(rng, rows: int, days: int = DAYS) -> pd.DatetimeIndex:
+    """Returns sorted timestamps, to the second, spread over the days."""
+    seconds = np.sort(rng.integers(0, days * 86400, rows))
+    return START + pd.to_timedelta(seconds, unit="s")
+
+
+def amounts(rng, rows: int, low: float, high: float, decimals: int = 8) -> np.ndarray:
+    """Returns amounts spread log-uniformly between low and high."""
+    return np.round(np.exp(rng.uniform(np.log(low), np.log(high), rows)), decimals)
+
+
+def choices(rng, rows: int, values, p=None) -> np.ndarray:
+    return np.array(values, dtype=object)[rng.choice(len(values), rows, p=p)]
+
+
+def markets(rng, rows: int):
+    """Returns the base coin, quote coin and price of each row's market."""
+    picked = rng.integers(0, len(MARKETS), rows)
+    bases, quotes, prices = (np.array(column, dtype=object) for column in zip(*MARKETS))
+    prices = prices.astype(np.float64)[picked] * rng.uniform(0.5, 1.5, rows)
+    return bases[picked], quotes[picked], np.round(prices, 8)
+
+
+def ids(rng, rows: int, start: int) -> np.ndarray:
+    return start + np.cumsum(rng.integers(1, 50, rows))
+
+
+def make_binance0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 0.1, 5000, 2)
+    return pd.DataFrame(
+        {
+            "Date(UTC)": dates(rng, rows).strftime(ISO_LAYOUT),
+            "Market": bases + quotes,
+            "Type": choices(rng, rows, ["BUY", "SELL"]),
+            "Price": prices,
+            "Amount": volume,
+            "Total": np.round(prices * volume, 8),
+            "Fee": np.round(volume * 0.001, 8),
+            "Fee Coin": bases,
+        }
+    )
+
+
+def _bit2c_rows(rng, rows):
+    actions = choices(
+        rng,
+        rows,
+        ["Buy", "Sell", "Deposit", "Withdrawal", "FeeWithdrawal"],
+        [0.4, 0.4, 0.08, 0.08, 0.04],
+    )
+    coin_index = rng.integers(0, len(BIT2C_COINS), rows)
+    coins = np.array([coin for coin, _ in BIT2C_COINS], dtype=object)[coin_index]
+    prices = np.array([price for _, price in BIT2C_COINS])[coin_index]
+    prices = np.round(prices * rng.uniform(0.3, 1.5, rows), 2)
+    volume = amounts(rng, rows, 0.001, 10)
+    is_trade = np.isin(actions, ["Buy", "Sell"])
+    return actions, coins, prices, volume, is_trade
+
+
+def make_bit2c0(rng, rows):
+    actions, coins, prices, volume, is_trade = _bit2c_rows(rng, rows)
+    return pd.DataFrame(
+        {
+            "Date": dates(rng, rows).strftime(ISO_LAYOUT),
+            "Action": actions,
+            "firstCoin": coins,
+            "Currency": np.where(is_trade, "ILS", None),
+            "Volume": np.where(actions == "Sell", -volume, volume),
+            "Price": prices,
+            "Fee": np.round(volume * prices * 0.005, 6),
+            "FeeCurrency": np.where(is_trade, "ILS", None),
+            "Source": "B2C",
+        },
+        columns=formats.bit2c0,
+    )
+
+
+def make_bit2c1(rng, rows, balances: bool = False):
+    actions, coins, prices, volume, is_trade = _bit2c_rows(rng, rows)
+    sign = np.where(np.isin(actions, ["Sell", "Withdrawal", "FeeWithdrawal"]), -1, 1)
+    second_amount = np.where(is_trade, np.round(-sign * volume * prices, 6), np.nan)
+    references = pd.Series(ids(rng, rows, 90_000_000)).astype(str)
+    table = {
+        "id": ids(rng, rows, 200_000),
+        "created": dates(rng, rows).strftime(ISO_LAYOUT),
+        "accountAction": actions,
+        "firstCoin": coins,
+        "secondCoin": np.where(is_trade, "NIS", None),
+        "firstAmount": sign * volume,
+        "secondAmount": second_amount,
+        "price": prices,
+        "feeAmount": np.round(volume * prices * 0.005, 6),
+        "fee": np.where(is_trade, 0.5, np.nan),
+        "ref": ("BtcNis|" + references).to_numpy(),
+    }
+    if balances:
+        table["balance1"] = amounts(rng, rows, 0.01, 100)
+        table["balance2"] = amounts(rng, rows, 1, 100_000, 6)
+    signature = formats.bit2c2 if balances else formats.bit2c1
+    return pd.DataFrame(table, columns=signature)
+
+
+def make_bit2c2(rng, rows):
+    return make_bit2c1(rng, rows, balances=True)
+
+
+def make_bitfinex0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 0.01, 100) * rng.choice([-1, 1], rows)
+    return pd.DataFrame(
+        {
+            "#": ids(rng, rows, 300_000_000),
+            "PAIR": bases + "/" + quotes,
+            "AMOUNT": volume,
+            "PRICE": prices,
+            "FEE": np.round(-np.abs(volume) * 0.002, 8),
+            "FEE CURRENCY": np.where(volume > 0, bases, quotes),
+            "DATE": dates(rng, rows).strftime("%d-%m-%y %H:%M:%S"),
+            "ORDER ID": ids(rng, rows, 20_000_000_000),
+        }
+    )
+
+
+def make_bittrex0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 1, 100_000)
+    opened = dates(rng, rows)
+    closed = opened + pd.to_timedelta(rng.integers(0, 3600, rows), unit="s")
+    uuids = pd.Series(rng.integers(0, 2 ** 63, rows)).map("{:032x}".format)
+    return pd.DataFrame(
+        {
+            "Uuid": uuids.to_numpy(),
+            "Exchange": quotes + "-" + bases,
+            "TimeStamp": opened.strftime(US_LAYOUT),
+            "OrderType": choices(rng, rows, ["LIMIT_BUY", "LIMIT_SELL"]),
+            "Limit": prices,
+            "Quantity": volume,
+            "QuantityRemaining": 0.0,
+            "Commission": np.round(volume * prices * 0.0025, 8),
+            "Price": np.round(volume * prices, 8),
+            "PricePerUnit": prices,
+            "IsConditional": False,
+            "Condition": None,
+            "ConditionTarget": 0.0,
+            "ImmediateOrCancel": False,
+            "Closed": closed.strftime(US_LAYOUT),
+        }
+    )
+
+
+def make_cex0(rng, rows):
+    """CEX exports an order's row followed by the actions which filled it,
+    and sometimes by a fee row. Orders must be told apart by their amounts,
+    so the amounts of the orders which are near each other in time are
+    distinct steps of a geometric ladder, and the partial fills of an order
+    are smaller than any order.
+    """
+    # An order takes a little over two rows
+    orders = max(1, rows * 10 // 22)
+    ladder = 1.03 ** np.arange(300)
+    # At most 200 orders in the 30 days in which actions are matched
+    spacing = pd.Timedelta(days=30) / 200
+    order_dates = START + spacing * np.arange(orders)
+    is_buy = rng.random(orders) < 0.5
+    step = np.arange(orders) % len(ladder)
+    # USD for buy orders, coins for sell orders
+    order_amounts = np.round(np.where(is_buy, 100.0, 0.1) * ladder[step], 8)
+    split = step < 20
+    coin_index = rng.integers(0, len(CEX_COINS), orders)
+    bases = np.array([coin for coin, _ in CEX_COINS], dtype=object)[coin_index]
+    prices = np.array([price for _, price in CEX_COINS])[coin_index]
+    prices = np.round(prices * rng.uniform(0.5, 1.5, orders), 4)
+
+    records = []
+    for order in range(orders):
+        date = order_dates[order]
+        amount = order_amounts[order]
+        base, price = bases[order], prices[order]
+        side, symbol = ("Buy", "USD") if is_buy[order] else ("Sell", base)
+        number = 5_000_000_000 + order
+        records.append(
+            (date, -amount, symbol, side.lower(), None, f"{side} Order #{number}")
+        )
+        parts = [amount * 0.45, amount * 0.55] if split[order] else [amount]
+        for part in parts:
+            if is_buy[order]:
+                coins = part / price
+                comment = f"Bought {coins:.8f} {base} at {price:.4f} USD"
+                records.append((date, round(coins, 8), base, "buy", f"{base}/USD", comment))
+            else:
+                comment = f"Sold {part:.8f} {base} at {price:.4f} USD"
+                records.append(
+                    (date, round(part * price, 2), "USD", "sell", f"{base}/USD", comment)
+                )
+        if rng.random() < 0.1:
+            comment = f"Reimbursed excess for order #{number}"
+            records.append((date, 0.01, "USD", "costsNothing", None, comment))
+    table = pd.DataFrame(
+        records, columns=["DateUTC", "Amount", "Symbol", "Type", "Pair", "Comment"]
+    )
+    table["DateUTC"] = pd.DatetimeIndex(table["DateUTC"]).strftime("%m/%d/%y %I:%M %p")
+    table["Balance"] = 0.0
+    table["FeeSymbol"] = np.where(table["Pair"].notna(), "USD", None)
+    table["FeeAmount"] = np.where(table["Pair"].notna(), 0.0, np.nan)
+    return table[list(formats.cex0)]
+
+
+def make_ledgers0(rng, rows):
+    """Kraken ledgers hold each trade as two rows sharing a reference,
+    among deposits and withdrawals.
+    """
+    events = max(1, rows // 2)
+    is_trade = rng.random(events) < 0.85
+    bases, quotes, prices = markets(rng, events)
+    kraken = {"BTC": "XXBT", "ETH": "XETH", "LTC": "XLTC", "XRP": "XXRP", "ZEC": "XZEC"}
+    kraken["USD"] = "ZUSD"
+    volume = amounts(rng, events, 0.01, 100)
+    sign = rng.choice([-1, 1], events)
+    event_dates = dates(rng, events).strftime(ISO_LAYOUT)
+    references = pd.Series(rng.integers(0, 2 ** 40, events)).map("T{:012X}".format)
+    others = choices(rng, events, ["deposit", "withdrawal"])
+
+    first = pd.DataFrame(
+        {
+            "refid": references,
+            "time": event_dates,
+            "type": np.where(is_trade, "trade", others),
+            "asset": pd.Series(bases).map(kraken),
+            "amount": sign * volume,
+            "fee": 0.0,
+        }
+    )
+    second = pd.DataFrame(
+        {
+            "refid": references,
+            "time": event_dates,
+            "type": "trade",
+            "asset": pd.Series(quotes).map(kraken),
+            "amount": np.round(-sign * volume * prices, 8),
+            "fee": np.round(volume * prices * 0.0026, 8),
+        }
+    ).loc[is_trade]
+    table = pd.concat([first, second]).sort_index(kind="stable").reset_index(drop=True)
+    table["txid"] = pd.Series(rng.integers(0, 2 ** 40, len(table))).map("L{:012X}".format)
+    table["aclass"] = "currency"
+    table["balance"] = amounts(rng, len(table), 0.01, 1000)
+    return table[list(formats.ledgers0)]
+
+
+def make_lqui0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 1, 10_000)
+    total = np.round(volume * prices, 10)
+    is_buy = rng.random(rows) < 0.5
+    return pd.DataFrame(
+        {
+            "Date": dates(rng, rows).strftime("%d.%m.%Y %H:%M:%S"),
+            "Market": bases + "/" + quotes,
+            "Type": np.where(is_buy, "BUY", "SELL"),
+            "Price": prices,
+            "Amount": volume,
+            "Total": total,
+            "Fee": "0.1%",
+            "OrderId": ids(rng, rows, 450_000_000),
+            "TradeId": ids(rng, rows, 99_000_000),
+            "Change Base": np.where(is_buy, volume * 0.999, -volume),
+            " Change Quote": np.where(is_buy, -total, total * 0.999),
+        }
+    )
+
+
+def make_member0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 0.01, 100)
+    return pd.DataFrame(
+        {
+            "Symbol": bases,
+            "Currency": quotes,
+            "Action": choices(rng, rows, ["buy", "sell"]),
+            "Volume": volume,
+            "PRICE": prices,
+            "FEE": np.round(-volume * 0.002, 8),
+            "FEECURRENCY": bases,
+            "DATE": dates(rng, rows).strftime(ISO_LAYOUT),
+            "Source": "Bitfinex",
+        }
+    )
+
+
+SHAPESHIFT_COINS = ["BTC", "ETH", "LTC", "ZEC"]
+
+
+def make_shapeshift0(rng, rows):
+    """Shapeshift's prices are computed from rates, which the benchmark
+    serves from a local price store (see shapeshift_rates).
+    """
+    bought = choices(rng, rows, SHAPESHIFT_COINS)
+    sold = np.where(bought == "BTC", "ETH", "BTC")
+    volume = amounts(rng, rows, 0.01, 50)
+    by_sale = rng.random(rows) < 0.2
+    return pd.DataFrame(
+        {
+            "כמות רכישה": np.where(by_sale, np.nan, volume),
+            "מטבע רכישה": bought,
+            "כמות מכירה": np.where(by_sale, volume, np.nan),
+            "מטבע מכירה": sold,
+            "עמלה (אופציונלי)": np.nan,
+            "מטבע עמלה (אופציונלי)": None,
+            "זירה": "ShapeShift",
+            "אסמכתא (אופציונלי)": None,
+            "תאריך": dates(rng, rows).strftime(US_LAYOUT),
+        }
+    )
+
+
+def shapeshift_rates(rng=None):
+    """Yields a USD rate for every coin and day the Shapeshift
+    generator may use.
+    """
+    rng = rng or np.random.default_rng(0)
+    for coin in SHAPESHIFT_COINS:
+        for day in pd.date_range(START, periods=DAYS + 1, freq="D"):
+            yield coin, day.strftime("%Y-%m-%d"), float(rng.uniform(10, 10_000))
+
+
+def make_trade0(rng, rows, fee_columns: bool = False):
+    bases, quotes, prices = markets(rng, rows)
+    volume = amounts(rng, rows, 0.1, 1000)
+    total = np.round(volume * prices, 8)
+    is_buy = rng.random(rows) < 0.5
+    fee_rates = choices(rng, rows, [0.0015, 0.0025], [0.7, 0.3]).astype(np.float64)
+    table = {
+        "Date": dates(rng, rows).strftime(ISO_LAYOUT),
+        "Market": bases + "/" + quotes,
+        "Category": "Exchange",
+        "Type": np.where(is_buy, "Buy", "Sell"),
+        "Price": prices,
+        "Amount": volume,
+        "Total": total,
+        "Fee": np.where(fee_rates == 0.0015, "0.15%", "0.25%"),
+        "Order Number": ids(rng, rows, 100_000_000_000),
+        "Base Total Less Fee": np.where(is_buy, -total, total * (1 - fee_rates)),
+        "Quote Total Less Fee": np.where(is_buy, volume * (1 - fee_rates), -volume),
+    }
+    if fee_columns:
+        table["Fee Currency"] = np.where(is_buy, bases, quotes)
+        fee_base = np.where(is_buy, volume, total)
+        table["Fee Total"] = np.round(fee_base * fee_rates, 8)
+    return pd.DataFrame(table)
+
+
+def make_trade1(rng, rows):
+    return make_trade0(rng, rows, fee_columns=True)
+
+
+def make_trades0(rng, rows):
+    bases, quotes, prices = markets(rng, rows)
+    quantity = amounts(rng, rows, 0.01, 100, 3)
+    volume = np.round(quantity * prices, 8)
+    fee = np.round(volume * 0.001, 8)
+    is_buy = rng.random(rows) < 0.5
+    return pd.DataFrame(
+        {
+            "Date (UTC)": dates(rng, rows).strftime(ISO_LAYOUT),
+            "Instrument": bases + "/" + quotes,
+            "Trade ID": ids(rng, rows, 420_000_000),
+            "Order ID": ids(rng, rows, 84_000_000_000),
+            "Side": np.where(is_buy, "buy", "sell"),
+            "Quantity": quantity,
+            "Price": prices,
+            "Volume": volume,
+            "Fee": fee,
+            "Rebate": 0.0,
+            "Total": np.where(is_buy, -(volume + fee), volume - fee),
+        }
+    )
+
+
+def make_idex1(rng, rows):
+    tokens = choices(rng, rows, ["AUC", "IDEX", "LINK", "DAI"])
+    token_amount = amounts(rng, rows, 1, 10_000, 4)
+    ether_amount = np.round(token_amount * rng.uniform(0.0001, 0.001, rows), 8)
+    hashes = pd.Series(rng.integers(0, 2 ** 63, rows)).map("0x{:064x}".format)
+    return pd.DataFrame(
+        {
+            "transactionId": ids(rng, rows, 5_000_000),
+            "transactionHash": hashes.to_numpy(),
+            "date": dates(rng, rows).strftime(ISO_LAYOUT),
+            "market": tokens + "/ETH",
+            "makerOrTaker": choices(rng, rows, ["maker", "taker"]),
+            "buyOrSell": choices(rng, rows, ["buy", "sell"]),
+            "tokenAmount": token_amount,
+            "etherAmount": ether_amount,
+            "usdValue": np.round(ether_amount * 300, 2),
+            "fee": np.round(ether_amount * 0.001, 8),
+            "gasFee": "N/A",
+            "feesPaidIn": "ETH",
+        }
+    )
+
+
+GENERATORS = {
+    "binance0": make_binance0,
+    "bit2c0": make_bit2c0,
+    "bit2c1": make_bit2c1,
+    "bit2c2": make_bit2c2,
+    "bitfinex0": make_bitfinex0,
+    "bittrex0": make_bittrex0,
+    "cex0": make_cex0,
+    "ledgers0": make_ledgers0,
+    "lqui0": make_lqui0,
+    "member0": make_member0,
+    "shapeshift0": make_shapeshift0,
+    "trade0": make_trade0,
+    "trade1": make_trade1,
+    "trades0": make_trades0,
+    "idex1": make_idex1,
+}
+
+
+def generate(name: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    """Returns a synthetic export of the format with about the given
+    number of rows.
+    """
+    table = GENERATORS[name](np.random.default_rng(seed), rows)
+    assert tuple(table.columns) == getattr(formats, name), name
+    return table
+
+
+def write_export(
+    name: str, rows: int, fname: pathlib.Path, seed: int = 0, excel: bool = None
+) -> pathlib.Path:
+    """Writes a synthetic export of the format, as a workbook if the
+    exchange exports workbooks and excel isn't False, and returns its name.
+    """
+    if excel is None:
+        excel = name in EXCEL_FORMATS
+    table = generate(name, rows, seed)
+    fname = pathlib.Path(fname).with_suffix(".xlsx" if excel else ".csv")
+    if excel:
+        _write_workbook(table, fname)
+    else:
+        table.to_csv(fname, index=False)
+    return fname
+
+
+def _write_workbook(table: pd.DataFrame, fname: pathlib.Path):
+    # openpyxl's write-only mode is many times faster than to_excel()
+    from openpyxl import Workbook
+
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet()
+    sheet.append(list(table.columns))
+    for row in table.astype(object).itertuples(index=False):
+        sheet.append([None if pd.isna(value) else value for value in row])
+    book.save(fname)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("format", choices=sorted(GENERATORS))
+    parser.add_argument("rows", type=int)
+    parser.add_argument("fname", type=pathlib.Path)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--excel", action=argparse.BooleanOptionalAction, default=None)
+    args = parser.parse_args(argv)
+    print(write_export(args.format, args.rows, args.fname, args.seed, args.excel))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmarks the splitting of market columns into their base and quote coins
+against splitting each row's string, for every market convention.
+
+Run from the repository's root:
+
+    python benchmarks/market_parsing.py --rows 1000000
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+import generators  # noqa: E402
+import markets  # noqa: E402
+
+
+def make_markets(rows: int, convention: str, seed: int = 0) -> pd.Series:
+    bases, quotes, _ = generators.markets(np.random.default_rng(seed), rows)
+    separator, quote_first = markets.CONVENTIONS[convention]
+    first, second = (quotes, bases) if quote_first else (bases, quotes)
+    return pd.Series(first + separator + second)
+
+
+def split_rows(column: pd.Series, convention: str):
+    """Splits the markets the way the converters used to, row by row."""
+    separator, quote_first = markets.CONVENTIONS[convention]
+    first = column.str.split(separator, expand=True)[0]
+    second = column.str.split(separator, expand=True)[1]
+    return (second, first) if quote_first else (first, second)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    for convention in markets.CONVENTIONS:
+        column = make_markets(args.rows, convention)
+        markets.parse_market.cache_clear()
+        cold, (bases, quotes) = timed(markets.split_markets, column, convention)
+        warm, _ = timed(markets.split_markets, column, convention)
+        line = f"{convention:<11} split_markets {cold:.3f}s (memoized {warm:.3f}s)"
+        if markets.CONVENTIONS[convention].separator:
+            by_row, (expected_bases, expected_quotes) = timed(split_rows, column, convention)
+            assert (bases.astype(object) == expected_bases).all()
+            assert (quotes.astype(object) == expected_quotes).all()
+            line += f", str.split {by_row:.3f}s ({by_row / cold:.0f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
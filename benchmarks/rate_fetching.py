@@ -0,0 +1,103 @@
+"""
+Benchmarks the resolution of Shapeshift conversion rates against a local
+fake Bitfinex endpoint with an injected latency.
+
+Run from the repository's root:
+
+    python benchmarks/rate_fetching.py --rows 2000 --days 200 --latency 0.05
+"""
+import argparse
+import http.server
+import json
+import pathlib
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+import rate_fetcher  # noqa: E402
+from price_cache import RateCache  # noqa: E402
+
+
+class FakeBitfinex(http.server.BaseHTTPRequestHandler):
+    """Answers every trades query with a single trade after a delay.
+    Every ``throttle_every``-th request is answered with a 429.
+    """
+
+    latency = 0.0
+    throttle_every = 0
+    requests_served = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            FakeBitfinex.requests_served += 1
+            served = FakeBitfinex.requests_served
+        time.sleep(self.latency)
+        if self.throttle_every and served % self.throttle_every == 0:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.01")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        coin = re.search(r"/trades/t(\w+?)USD/", self.path).group(1)
+        body = json.dumps([[1, 0, 1.0, float(len(coin))]]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_table(rows: int, days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    coins = np.array(["BTC", "ETH", "LTC", "XRP", "ZEC"])
+    dates = pd.Timestamp("2018-01-01", tz="UTC") + pd.to_timedelta(
+        rng.integers(0, days * 86400, rows), unit="s"
+    )
+    return pd.DataFrame(
+        {"coin": coins[rng.integers(0, len(coins), rows)], "date": dates}
+    )
+
+
+def run(rows, days, latency, throttle_every, workers):
+    FakeBitfinex.latency = latency
+    FakeBitfinex.throttle_every = throttle_every
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeBitfinex)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rate_fetcher.BITFINEX_URL = (
+        f"http://127.0.0.1:{server.server_address[1]}/v2/trades/t{{}}USD/hist"
+    )
+    table = make_table(rows, days)
+    results = {}
+    for max_workers in workers:
+        FakeBitfinex.requests_served = 0
+        start = time.perf_counter()
+        rate_fetcher.resolve_rates(
+            table["coin"], table["date"], RateCache(":memory:"), max_workers
+        )
+        elapsed = time.perf_counter() - start
+        results[max_workers] = (elapsed, FakeBitfinex.requests_served)
+    server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+    results = run(args.rows, args.days, args.latency, args.throttle_every, args.workers)
+    for max_workers, (elapsed, served) in results.items():
+        print(f"{max_workers:>3} workers: {elapsed:.2f}s, {served} requests")
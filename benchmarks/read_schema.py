@@ -0,0 +1,56 @@
+"""
+Compares reading a scaled-up Liqui export without a schema, as the
+pipeline used to, with reading it through its format's read schema.
+
+Run from the repository's root:
+
+    python benchmarks/read_schema.py --scale 200
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+import pipeline  # noqa: E402
+from formats import lqui0, table_origin  # noqa: E402
+
+
+EXAMPLE = pathlib.Path(__file__).resolve().parents[1] / "examples" / "lqui.csv"
+
+
+def measure(read, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = read()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, data.memory_usage(deep=True).sum()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    original = pd.read_csv(EXAMPLE, header=0)
+    with tempfile.TemporaryDirectory() as directory:
+        fname = pathlib.Path(directory) / "lqui.csv"
+        pd.concat([original] * args.scale).to_csv(fname, index=False)
+        before = measure(lambda: pd.read_csv(fname, header=0), args.repeat)
+        after = measure(
+            lambda: pipeline.read_data(fname, table_origin[lqui0]), args.repeat
+        )
+    print(f"{len(original) * args.scale} rows, CSV engine: {pipeline.CSV_ENGINE}")
+    print(f"before: {before[0]:.3f}s, {before[1] / 2 ** 20:.1f} MiB")
+    print(f"after:  {after[0]:.3f}s, {after[1] / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
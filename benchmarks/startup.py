@@ -0,0 +1,88 @@
+"""
+Measures the startup time of the converter: the cold import time of its
+entry modules and the time from interpreter start to the end of the first
+conversion. Each measurement runs in a fresh interpreter, and the results
+are printed as JSON.
+
+Run from the repository's root:
+
+    python benchmarks/startup.py --repeat 5 examples/lqui.csv
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+CONVERT_FORMAT = pathlib.Path(__file__).resolve().parents[1] / "convert_format"
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import json, sys
+print(json.dumps({{"seconds": elapsed, "requests_loaded": "requests" in sys.modules}}))
+"""
+
+CONVERSION_SCRIPT = """
+import time
+start = time.perf_counter()
+import pathlib
+from pipeline import run
+run(pathlib.Path({fname!r}))
+elapsed = time.perf_counter() - start
+import json, sys
+print(json.dumps({{"seconds": elapsed, "requests_loaded": "requests" in sys.modules}}))
+"""
+
+
+def measure(script: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=CONVERT_FORMAT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "requests_loaded": any(run["requests_loaded"] for run in runs),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", type=pathlib.Path, help="File of the first conversion")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--modules", nargs="+", default=["formats", "cli", "pipeline", "table_handler"]
+    )
+    args = parser.parse_args(argv)
+
+    results = {"imports": {}, "first_conversion": None}
+    for module in args.modules:
+        results["imports"][module] = measure(
+            IMPORT_SCRIPT.format(module=module), args.repeat
+        )
+    with tempfile.TemporaryDirectory() as directory:
+        # Converting a copy keeps the converted file out of the original's folder
+        copy = pathlib.Path(directory) / args.file.name
+        copy.write_bytes(args.file.read_bytes())
+        results["first_conversion"] = measure(
+            CONVERSION_SCRIPT.format(fname=str(copy)), args.repeat
+        )
+    results["file"] = str(args.file)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
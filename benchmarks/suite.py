@@ -0,0 +1,309 @@
+"""
+Measures the conversion of synthetic exports of every format, stage by
+stage, and stores the results as JSON so that versions can be compared.
+
+Each format is converted from a file of each size in a fresh process,
+where every stage of the pipeline - identifying the format, reading,
+converting, filtering and writing - is timed and its peak memory (RSS)
+sampled, followed by a conversion through pipeline.convert() as a whole.
+
+Run from the repository's root:
+
+    python benchmarks/suite.py --rows 1000 100000 1000000 --output before.json
+    python benchmarks/suite.py --compare before.json after.json
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+import generators  # noqa: E402
+from profiling import current_rss  # noqa: E402
+
+
+DEFAULT_ROWS = (1000, 100_000)
+SAMPLE_INTERVAL = 0.005
+MB = 1 << 20
+
+
+class MemorySampler:
+    """Samples the process's resident memory in the background while
+    a stage runs. Where /proc isn't available, the process's peak so far
+    is reported instead.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        if self.peak is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.peak is None:
+            self.peak = peak_rss()
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+
+def peak_rss() -> int:
+    """Returns the process's peak resident memory so far, in bytes."""
+    if sys.platform == "win32":
+        # Windows has no resource module, but psutil tells the peak
+        try:
+            import psutil
+        except ImportError:
+            return current_rss() or 0
+        return psutil.Process().memory_info().peak_wset
+    import resource
+
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def stage_result(seconds: float, rows_in: int, rows_out: int, peak: int) -> dict:
+    return {
+        "seconds": round(seconds, 6),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "rows_per_second": round(rows_in / seconds) if seconds and rows_in else None,
+        "peak_rss_mb": round(peak / MB, 1),
+    }
+
+
+def measure(fname: pathlib.Path) -> dict:
+    """Converts the file stage by stage and then as a whole, returning
+    each stage's time, rows and peak memory.
+    """
+    import pipeline
+    import price_cache
+    import price_store
+    from formats import load_converter
+    from writers import TableWriter
+
+    # Shapeshift's prices are looked up in a local store rather than fetched
+    price_cache._default_cache = price_cache.RateCache(":memory:", offline=True)
+    price_store._default_store = shapeshift_store(fname.parent / "prices")
+
+    stages = {}
+    state = {}
+
+    def stage(name, function, rows_in=None):
+        with MemorySampler() as sampler:
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+        rows_out = len(result) if isinstance(result, pd.DataFrame) else 0
+        if rows_in is None:
+            rows_in = rows_out
+        stages[name] = stage_result(elapsed, rows_in, rows_out, sampler.peak)
+        return result
+
+    table_format = stage("sniff", lambda: pipeline.sniff_format(fname), 0)
+    data = stage("read", lambda: pipeline.read_data(fname, table_format))
+    converter = load_converter(table_format.converter)
+    returned = stage("convert", lambda: converter(data), len(data))
+
+    def filter_rows():
+        reordered = pipeline.reorder_columns(pipeline.categorize(returned))
+        filtered = pipeline.filter_unneeded_rows(reordered)
+        state["filtered"] = pipeline.replace_invalid_currencies(filtered)
+        return state["filtered"].data
+
+    converted = stage("filter", filter_rows, len(returned))
+    with tempfile.TemporaryDirectory() as directory:
+
+        def write():
+            with TableWriter(pathlib.Path(directory) / "converted.csv") as writer:
+                writer.write(converted)
+
+        stage("write", write, len(converted))
+    del data, returned, converted, state["filtered"]
+
+    with MemorySampler() as sampler:
+        start = time.perf_counter()
+        result = pipeline.convert(fname)
+        elapsed = time.perf_counter() - start
+    assert result.success, result.summary
+    pipeline.output_fname(fname).unlink()
+    return {
+        "stages": stages,
+        "pipeline": stage_result(
+            elapsed, result.original_size, result.converted_size, sampler.peak
+        ),
+    }
+
+
+def shapeshift_store(directory: pathlib.Path):
+    """Returns a price store of the rates the Shapeshift generator may
+    use, creating it the first time.
+    """
+    import price_store
+
+    store = price_store.PriceStore(directory)
+    if not store.pairs():
+        rates = pd.DataFrame(generators.shapeshift_rates(), columns=["coin", "day", "rate"])
+        for coin, prices in rates.groupby("coin"):
+            store.add(coin, pd.to_datetime(prices["day"], utc=True), prices["rate"])
+    return store
+
+
+def run_format(name: str, rows: int, data_dir: pathlib.Path, excel: bool, repeat: int):
+    """Measures the format in fresh processes, keeping the fastest run."""
+    suffix = ".xlsx" if excel and name in generators.EXCEL_FORMATS else ".csv"
+    fname = data_dir / f"{name}-{rows}{suffix}"
+    if not fname.exists():
+        generators.write_export(name, rows, fname, excel=fname.suffix == ".xlsx")
+    runs = []
+    for _ in range(repeat):
+        # The sheet cache would turn every read after the first into a hit
+        env = dict(os.environ, CONVERT_FORMAT_SHEET_CACHE_MB="0")
+        completed = subprocess.run(
+            [sys.executable, __file__, "--measure", str(fname)],
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        runs.append(json.loads(completed.stdout))
+    best = min(runs, key=lambda run: run["pipeline"]["seconds"])
+    return {"format": name, "rows": rows, "file": fname.name, **best}
+
+
+def environment() -> dict:
+    root = pathlib.Path(__file__).resolve().parents[1]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_result(result: dict):
+    pipeline_result = result["pipeline"]
+    print(
+        f"{result['format']:<12}{result['rows']:>9} rows "
+        f"{pipeline_result['seconds']:>9.3f}s "
+        f"{pipeline_result['rows_per_second'] or '-':>10} rows/s "
+        f"{pipeline_result['peak_rss_mb']:>8.1f} MiB"
+    )
+    for name, stage in result["stages"].items():
+        print(
+            f"  {name:<10}{stage['rows_in']:>19} rows "
+            f"{stage['seconds']:>9.3f}s "
+            f"{stage['rows_per_second'] or '-':>10} rows/s "
+            f"{stage['peak_rss_mb']:>8.1f} MiB"
+        )
+
+
+def compare(old_fname: pathlib.Path, new_fname: pathlib.Path):
+    """Prints the change of every stage's time and peak memory between
+    two result files.
+    """
+    old, new = (json.loads(pathlib.Path(f).read_text()) for f in (old_fname, new_fname))
+    # The file's name tells its format, size and whether it's a workbook
+    old_results = {r["file"]: r for r in old["results"]}
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    for result in new["results"]:
+        if result["file"] not in old_results:
+            continue
+        before = old_results[result["file"]]
+        print(result["file"])
+        pairs = [("pipeline", before["pipeline"], result["pipeline"])]
+        pairs += [
+            (name, before["stages"][name], stage)
+            for name, stage in result["stages"].items()
+            if name in before["stages"]
+        ]
+        for name, was, now in pairs:
+            speedup = was["seconds"] / now["seconds"] if now["seconds"] else float("inf")
+            print(
+                f"  {name:<10}{was['seconds']:>9.3f}s -> {now['seconds']:>9.3f}s "
+                f"({speedup:.2f}x)  "
+                f"{was['peak_rss_mb']:>8.1f} -> {now['peak_rss_mb']:>8.1f} MiB"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--formats", nargs="+", choices=sorted(generators.GENERATORS), metavar="FORMAT"
+    )
+    parser.add_argument("--rows", nargs="+", type=int, default=list(DEFAULT_ROWS))
+    parser.add_argument(
+        "--data-dir",
+        type=pathlib.Path,
+        help="Where the generated files are kept, and reused from by later runs",
+    )
+    parser.add_argument(
+        "--excel",
+        action="store_true",
+        help="Generate workbooks for the formats which are exported as such",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", type=pathlib.Path, help="The results' JSON file")
+    parser.add_argument("--compare", nargs=2, type=pathlib.Path, metavar=("OLD", "NEW"))
+    parser.add_argument("--measure", type=pathlib.Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = args.data_dir or pathlib.Path(directory)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        for rows in args.rows:
+            for name in args.formats or sorted(generators.GENERATORS):
+                result = run_format(name, rows, data_dir, args.excel, args.repeat)
+                print_result(result)
+                results.append(result)
+    if args.output:
+        report = {"environment": environment(), "results": results}
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+This module finds which CEX actions ("Bought ..." / "Sold ..." rows)
+make up a single CEX order.
+
+An order is usually filled by one action, but it may be split into
+several partial fills whose expected amounts sum up to the amount of
+the order. Finding these groups is a subset-sum problem. Trying every
+combination of the candidate actions is exponential, so the search
+here is a branch-and-bound over the candidates in their original order,
+which returns the same group a brute-force scan with
+``itertools.combinations`` would have returned, and is preceded by a
+cheap reachability check over scaled integers that rejects orders no
+group of actions can fill.
+"""
+import numpy as np
+
+
+MAX_GROUP_SIZE = 19
+MAX_CANDIDATES = 64
+MAX_SCALED_SUM = 1 << 16
+# The partial groups the search of an order may try before it gives up
+MAX_SEARCHED_GROUPS = 10_000_000
+
+
+class TooManyCandidates(ValueError):
+    """Raised when no group of actions matches an order, but only some of
+    the actions which could belong to it, or only some of their groups,
+    were searched.
+    """
+
+
+class UnparsedActions(ValueError):
+    """Raised when the comments of CEX actions can't be parsed. Its
+    ``unparsed`` table holds their comments and the reason each one was
+    rejected, indexed by their rows.
+    """
+
+    def __init__(self, unparsed):
+        super().__init__(f"Unable to parse {len(unparsed)} CEX actions.")
+        self.unparsed = unparsed
+
+
+def find_single_action(expected: np.ndarray, target: float) -> np.ndarray:
+    """Returns the positions of the actions that on their own match
+    the given order amount.
+    """
+    # Same comparison as np.isclose(expected, target, 0.01, 0.001), without
+    # its overhead, which dominates for the few candidates of each order
+    return np.flatnonzero(np.abs(expected - target) <= 0.001 + 0.01 * abs(target))
+
+
+def find_action_group(
+    expected: np.ndarray,
+    target: float,
+    max_group_size: int = MAX_GROUP_SIZE,
+    distances: np.ndarray = None,
+):
+    """Returns the positions of the smallest group of actions (at least two)
+    whose expected amounts sum up to the order amount, or None if no
+    such group exists.
+
+    Among groups of the same size the first one in the order of
+    ``expected`` is returned. All expected amounts must be non-negative.
+
+    Only the MAX_CANDIDATES actions with the smallest distances from the
+    order (the first ones if no distances are given) are searched. If
+    none of their groups matches while other actions were left out,
+    TooManyCandidates is raised.
+    """
+    expected = np.asarray(expected, dtype=np.float64)
+    candidates = np.arange(len(expected))
+    if len(expected) > MAX_CANDIDATES:
+        if distances is not None:
+            closest = np.argsort(distances, kind="stable")[:MAX_CANDIDATES]
+            # Back in the actions' order, which breaks the ties between groups
+            candidates = np.sort(closest)
+        else:
+            candidates = candidates[:MAX_CANDIDATES]
+    group = _find_group(expected[candidates], target, max_group_size)
+    if group is not None:
+        return candidates[group]
+    if len(candidates) < len(expected):
+        raise TooManyCandidates(
+            f"No group of the {MAX_CANDIDATES} actions closest to the order "
+            f"matches it, and {len(expected) - len(candidates)} more actions "
+            "could belong to it."
+        )
+    return None
+
+
+def _find_group(values: np.ndarray, target: float, max_group_size: int):
+    """Searches the values for the smallest matching group, as
+    find_action_group() describes.
+    """
+    num_of_values = len(values)
+    tolerance = 0.01 + 0.01 * abs(target)
+    low, high = target - tolerance, target + tolerance
+    if num_of_values < 2 or not _is_reachable(values, low, high):
+        return None
+    largest, smallest = _suffix_bounds(values)
+    values = values.tolist()
+    # Shared by the searches of all group sizes
+    budget = [MAX_SEARCHED_GROUPS]
+    for group_size in range(2, min(max_group_size, num_of_values) + 1):
+        found = _search_group(
+            values, group_size, low, high, largest, smallest, budget
+        )
+        if found is not None:
+            return np.array(found)
+    return None
+
+
+def _is_reachable(values: np.ndarray, low: float, high: float) -> bool:
+    """Checks whether any subset of the values could sum up to a number
+    in [low, high].
+
+    The values are scaled and rounded to integers and the reachable
+    sums are kept in a boolean array. The rounding errors are added to
+    the allowed range so this check never rejects a valid group,
+    though it may accept a group which the exact search later rejects.
+    """
+    if high < 0:
+        return False
+    values = values[values <= high]
+    if len(values) == 0:
+        return low <= 0
+    quantum = max(high / MAX_SCALED_SUM, 1e-12)
+    scaled = np.rint(values / quantum).astype(np.int64)
+    slack = len(scaled)
+    scaled_low = max(int(np.floor(low / quantum)) - slack, 0)
+    scaled_high = int(np.ceil(high / quantum)) + slack
+    reachable = np.zeros(scaled_high + 1, dtype=bool)
+    reachable[0] = True
+    for value in scaled:
+        if value == 0:
+            continue
+        reachable[value:] |= reachable[:-value].copy()
+        if reachable[scaled_low:].any():
+            return True
+    return bool(reachable[scaled_low:].any())
+
+
+def _suffix_bounds(values: np.ndarray):
+    """For every position i and count m returns the largest and smallest
+    sums of m values taken from values[i:].
+    """
+    num_of_values = len(values)
+    largest = np.full((num_of_values + 1, num_of_values + 1), -np.inf)
+    smallest = np.full((num_of_values + 1, num_of_values + 1), np.inf)
+    largest[:, 0] = 0.0
+    smallest[:, 0] = 0.0
+    for start in range(num_of_values):
+        suffix = np.sort(values[start:])
+        count = len(suffix)
+        smallest[start, 1 : count + 1] = np.cumsum(suffix)
+        largest[start, 1 : count + 1] = np.cumsum(suffix[::-1])
+    return largest.tolist(), smallest.tolist()
+
+
+def _search_group(values, group_size, low, high, largest, smallest, budget):
+    """Depth-first search for the first combination (in lexicographic
+    order of positions) of exactly group_size values with a sum in
+    [low, high]. Partial combinations which can no longer reach the
+    range are pruned using the precomputed suffix bounds.
+
+    Each tried partial combination uses up one of the budget's (a
+    one-item list) groups, and TooManyCandidates is raised when none
+    are left, since the search is exponential in the worst case.
+    """
+    num_of_values = len(values)
+    chosen = []
+
+    def descend(start, partial):
+        remaining = group_size - len(chosen)
+        if remaining == 0:
+            return low <= partial <= high
+        stop = num_of_values - remaining + 1
+        budget[0] -= stop - start
+        if budget[0] < 0:
+            raise TooManyCandidates(
+                f"No group of the {num_of_values} actions closest to the "
+                f"order was found among the first {MAX_SEARCHED_GROUPS} "
+                "which were searched."
+            )
+        for position in range(start, stop):
+            rest = remaining - 1
+            new_partial = partial + values[position]
+            if new_partial + smallest[position + 1][rest] > high:
+                continue
+            if new_partial + largest[position + 1][rest] < low:
+                continue
+            chosen.append(position)
+            if descend(position + 1, new_partial):
+                return True
+            chosen.pop()
+        return False
+
+    if descend(0, 0.0):
+        return chosen
+    return None
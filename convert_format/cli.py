@@ -0,0 +1,265 @@
+"""
+Command line converter, which converts many files at once without the GUI.
+
+Each argument can be a file, a glob pattern or a directory, in which case
+all of the CSV and Excel files in it are converted. The files are
+converted in parallel, and a JSON line summarizing each of them is
+printed. The exit code is non-zero if any of the files failed.
+
+    python cli.py exports/ "clients/**/*.csv" trades.xlsx --jobs 8
+
+The converted files are written as CSV, Parquet or Arrow files next to
+the originals, or added to a dataset partitioned by account and year:
+
+    python cli.py exports/ --format parquet --dataset ledger/
+
+Parquet and Arrow files are written with pyarrow, an optional dependency
+(the "columnar" extra).
+
+Cumulative exports can be converted incrementally: only the rows which
+weren't converted into the given directory before are converted, and they
+are appended to its converted files, one per account:
+
+    python cli.py exports/ --incremental ledger/
+
+When overlapping exports of the same account are converted together, the
+trades found in an earlier converted file can be dropped from the later
+ones:
+
+    python cli.py exports/ --deduplicate
+
+The converted files can then be merged into one chronological ledger,
+which tags each row with the file it came from:
+
+    python cli.py exports/ --deduplicate --merge ledger.csv
+
+The time, rows and memory of each stage of the conversions can be logged,
+and the conversions profiled with cProfile:
+
+    python cli.py exports/ --log timings.jsonl --profile profiles/
+"""
+import argparse
+import glob
+import json
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+SUFFIXES = (".csv", ".xls", ".xlsx")
+OUTPUT_FORMATS = ("csv", "parquet", "arrow")
+CONVERTED_SUFFIX = "_converted"
+
+
+def collect_files(paths) -> list:
+    """Expands the given files, globs and directories into a sorted
+    list of files to convert, skipping the already converted ones.
+    """
+    files = set()
+    for path in paths:
+        if glob.has_magic(path):
+            matches = glob.glob(path, recursive=True)
+            candidates = [pathlib.Path(match) for match in matches]
+        elif pathlib.Path(path).is_dir():
+            candidates = list(pathlib.Path(path).iterdir())
+        else:
+            candidates = [pathlib.Path(path)]
+        for candidate in candidates:
+            if candidate.is_dir() or candidate.suffix.lower() not in SUFFIXES:
+                continue
+            if candidate.stem.endswith(CONVERTED_SUFFIX):
+                continue
+            files.add(candidate)
+    return sorted(files)
+
+
+def convert_file(
+    file: pathlib.Path,
+    chunksize: int = None,
+    output_format: str = "csv",
+    dataset: pathlib.Path = None,
+    log: pathlib.Path = None,
+    profile_dir: pathlib.Path = None,
+    incremental: pathlib.Path = None,
+    max_workers: int = None,
+) -> dict:
+    """Converts a single file, returning its summary as a dictionary.
+    The file's profile is dumped to profile_dir, if given, under the
+    file's name.
+    """
+    start = time.perf_counter()
+    profile = None
+    if profile_dir is not None:
+        profile = profile_dir / (file.name + ".prof")
+    try:
+        # Only the workers need the pipeline and the libraries it loads
+        from pipeline import convert
+        from profiling import timings_to_dict
+
+        result = convert(
+            file,
+            chunksize,
+            output_format,
+            dataset,
+            log,
+            profile,
+            incremental,
+            max_workers=max_workers,
+        )
+    except Exception as e:  # a failing file mustn't stop the others
+        success, message = False, f"{type(e).__name__}: {e}"
+        converted_size, illegal_size, stages = 0, 0, []
+    else:
+        success, message = result.success, result.summary
+        converted_size = result.converted_size
+        illegal_size = sum(count for count, _ in result.illegal.values())
+        stages = [timings_to_dict(timing) for timing in result.stages]
+    return {
+        "file": str(file),
+        "status": "ok" if success else "failed",
+        "rows_converted": int(converted_size),
+        "illegal_rows": int(illegal_size),
+        "seconds": round(time.perf_counter() - start, 3),
+        "message": message,
+        "stages": stages,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Files, globs or directories")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=None,
+        help="Number of concurrent requests of each file whose rates are fetched",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Convert supported formats in chunks of this many rows",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Format of the converted files",
+    )
+    parser.add_argument(
+        "--dataset",
+        type=pathlib.Path,
+        default=None,
+        help="Add the converted rows to this dataset, partitioned by account "
+        "and year, instead of writing a file per input (Parquet or Arrow only)",
+    )
+    parser.add_argument(
+        "--incremental",
+        type=pathlib.Path,
+        default=None,
+        help="Convert only the rows which weren't converted into this directory "
+        "before, appending them to its files (one file at a time, without chunks)",
+    )
+    parser.add_argument(
+        "--deduplicate",
+        action="store_true",
+        help="Drop the rows of each converted CSV file which an earlier one "
+        "already has",
+    )
+    parser.add_argument(
+        "--merge",
+        type=pathlib.Path,
+        default=None,
+        help="Merge the converted CSV files into this file, ordered by date",
+    )
+    parser.add_argument(
+        "--log",
+        type=pathlib.Path,
+        default=None,
+        help="Append the time, rows and memory of each stage of every "
+        "conversion to this file, as JSON lines",
+    )
+    parser.add_argument(
+        "--profile",
+        type=pathlib.Path,
+        default=None,
+        help="Profile each conversion with cProfile, dumping the statistics "
+        "to this directory",
+    )
+    args = parser.parse_args(argv)
+    if args.dataset is not None and args.format == "csv":
+        parser.error("--dataset needs --format parquet or arrow")
+    if args.dataset is not None and args.incremental is not None:
+        parser.error("--incremental writes to its own directory, not to --dataset")
+    if args.deduplicate and (args.format != "csv" or args.dataset or args.incremental):
+        parser.error("--deduplicate works on converted CSV files only")
+    if args.merge and (args.format != "csv" or args.dataset or args.incremental):
+        parser.error("--merge works on converted CSV files only")
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No files to convert were found.", file=sys.stderr)
+        return 2
+    if args.profile is not None:
+        args.profile.mkdir(parents=True, exist_ok=True)
+    failures = 0
+    jobs = args.jobs
+    if args.incremental is not None:
+        # The files share the directory's manifests, so they're converted
+        # one after the other
+        jobs = 1
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        summaries = executor.map(
+            convert_file,
+            files,
+            [args.chunksize] * len(files),
+            [args.format] * len(files),
+            [args.dataset] * len(files),
+            [args.log] * len(files),
+            [args.profile] * len(files),
+            [args.incremental] * len(files),
+            [args.fetch_workers] * len(files),
+        )
+        converted = []
+        for summary in summaries:
+            failures += summary["status"] != "ok"
+            if summary["status"] == "ok":
+                converted.append(converted_fname(pathlib.Path(summary["file"])))
+            print(json.dumps(summary, ensure_ascii=False), flush=True)
+    if args.deduplicate and converted:
+        deduplicate_files(converted)
+    if args.merge and converted:
+        from ledger import merge_files
+
+        rows = merge_files(converted, args.merge)
+        summary = {"file": str(args.merge), "status": "merged", "rows": rows}
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+    return 1 if failures else 0
+
+
+def converted_fname(file: pathlib.Path) -> pathlib.Path:
+    return file.with_name(file.stem + CONVERTED_SUFFIX + ".csv")
+
+
+def deduplicate_files(files):
+    """Drops the rows which earlier files have from the converted files,
+    printing a JSON line with the duplicates of each.
+    """
+    from deduplication import deduplicate
+
+    for result in deduplicate(files):
+        summary = {
+            "file": str(result.file),
+            "status": "deduplicated",
+            "rows": int(result.rows),
+            "duplicate_rows": int(result.duplicates),
+        }
+        print(json.dumps(summary, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
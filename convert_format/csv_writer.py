@@ -0,0 +1,159 @@
+"""
+A CSV writer for the converted tables, which writes the same bytes as
+DataFrame.to_csv(index=False, header=False, float_format="%f") does.
+
+Instead of formatting each cell in Python, each column of a block of rows
+is rendered at once into a matrix with a row of bytes per field, padded
+with NUL bytes: numbers digit by digit with integer arithmetic, and text
+by encoding each distinct value once. The matrices are laid side by side
+with the commas and line ends, and dropping the padding leaves the block's
+lines, which are written in one call.
+"""
+import csv
+import io
+import os
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+
+BLOCK_SIZE = 65536
+FLOAT_DIGITS = 6
+SCALE = 10 ** FLOAT_DIGITS
+# Beyond this, scaled numbers can't be rounded to integers exactly
+MAX_SCALED = 2.0 ** 52
+POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.int64)
+# The only characters which the csv module quotes fields for, as pandas
+# configures it
+SPECIAL_CHARACTERS = ',"\r\n'
+ZERO, MINUS, POINT, COMMA = b"0-.,"
+# to_csv()'s default
+LINE_TERMINATOR = os.linesep
+
+
+def write_csv(data: pd.DataFrame, fname: pathlib.Path):
+    """Appends the rows of the table to the file as to_csv() would, with
+    index=False, header=False and float_format="%f".
+    """
+    terminator = np.frombuffer(LINE_TERMINATOR.encode(), np.uint8)
+    with open(fname, "ab") as f:
+        for start in range(0, len(data), BLOCK_SIZE):
+            block = data.iloc[start : start + BLOCK_SIZE]
+            fields = [_render(block[column]) for column in block.columns]
+            if any(field is None for field in fields):
+                # Columns of other types are left to pandas
+                # Rendered as text, since pandas writes to binary files only
+                # from 1.2 on
+                text = block.to_csv(header=False, index=False, float_format="%f")
+                f.write(text.encode())
+            else:
+                f.write(_join(fields, terminator))
+
+
+def _render(column: pd.Series):
+    """Renders the column's fields, or returns None if its type isn't
+    supported or it holds NUL characters, which would be taken for padding.
+    """
+    dtype = column.dtype
+    if pd.api.types.is_float_dtype(dtype):
+        return _render_floats(column.to_numpy(np.float64))
+    if isinstance(dtype, np.dtype) and pd.api.types.is_integer_dtype(dtype):
+        return _render_integers(column.to_numpy())
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        return _render_values(codes, column.cat.categories)
+    if dtype == object:
+        if pd.api.types.infer_dtype(column, skipna=True) not in ("string", "empty"):
+            # Distinct objects like 1 and 1.0 would be merged when factorized
+            return None
+        codes, uniques = pd.factorize(column)
+        return _render_values(codes, uniques)
+    return None
+
+
+def _render_floats(values: np.ndarray) -> np.ndarray:
+    """Formats the numbers as "%f" does: rounded to six decimal places,
+    with ties broken to even.
+    """
+    scaled = np.abs(values) * SCALE
+    # Infinities and NaNs have no fraction, and are formatted as the others
+    with np.errstate(invalid="ignore"):
+        fraction_part = scaled - np.floor(scaled)
+        # The multiplication is off by up to half a unit in the last place,
+        # so rounding numbers this close to a tie may be wrong
+        near_tie = np.abs(fraction_part - 0.5) <= np.spacing(scaled)
+    exact = np.isfinite(scaled) & (scaled < MAX_SCALED) & ~near_tie
+    rounded = np.where(exact, np.rint(scaled), 0).astype(np.int64)
+    whole, fraction = np.divmod(rounded, SCALE)
+    digits = 1 + np.searchsorted(POWERS_OF_TEN, whole, side="right")
+    negative = np.signbit(values)
+    lengths = negative + digits + 1 + FLOAT_DIGITS
+
+    # The rest are formatted one by one, as rarely any are
+    others = np.flatnonzero(~exact & ~np.isnan(values))
+    formatted = [("%f" % value).encode() for value in values[others].tolist()]
+    lengths[others] = [len(text) for text in formatted]
+    width = int(lengths.max(initial=1))
+
+    chars = np.empty((len(values), width), np.uint8)
+    for position in range(width - 1, width - 1 - FLOAT_DIGITS, -1):
+        chars[:, position] = ZERO + fraction % 10
+        fraction //= 10
+    chars[:, width - 1 - FLOAT_DIGITS] = POINT
+    for position in range(width - 2 - FLOAT_DIGITS, -1, -1):
+        chars[:, position] = ZERO + whole % 10
+        whole //= 10
+    chars[np.flatnonzero(negative), (width - lengths)[negative]] = MINUS
+    for row, text in zip(others, formatted):
+        chars[row, width - len(text) :] = np.frombuffer(text, np.uint8)
+    lengths[np.isnan(values)] = 0
+    # Pads the numbers, which are aligned to the right
+    chars[np.arange(width) < (width - lengths)[:, None]] = 0
+    return chars
+
+
+def _render_integers(values: np.ndarray) -> np.ndarray:
+    chars = values.astype(bytes)
+    return chars.view(np.uint8).reshape(len(values), chars.itemsize)
+
+
+def _render_values(codes: np.ndarray, uniques):
+    """Renders each of the distinct values once. Missing values have the
+    code -1 and are left empty.
+    """
+    texts = [value if type(value) is str else str(value) for value in uniques]
+    if "\0" in "".join(texts):
+        return None
+    if any(character in "".join(texts) for character in SPECIAL_CHARACTERS):
+        texts = [
+            quote(text) if any(c in text for c in SPECIAL_CHARACTERS) else text
+            for text in texts
+        ]
+    try:
+        # Plain ASCII text, by far the most common, is encoded in bulk
+        unique_chars = np.array(texts + [""], dtype=str).astype(bytes)
+    except UnicodeEncodeError:
+        unique_chars = np.array([text.encode() for text in texts] + [b""])
+    unique_chars = unique_chars.view(np.uint8).reshape(len(unique_chars), -1)
+    # -1 picks the empty value appended last
+    return unique_chars[codes]
+
+
+def quote(text: str) -> str:
+    """Quotes the text exactly as the csv module does for pandas."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=LINE_TERMINATOR).writerow([text])
+    return buffer.getvalue()[: -len(LINE_TERMINATOR)]
+
+
+def _join(fields: list, terminator: np.ndarray) -> bytes:
+    """Joins the rows' fields with commas and ends each row."""
+    rows = len(fields[0])
+    comma = np.full((rows, 1), COMMA, np.uint8)
+    parts = [fields[0]]
+    for field in fields[1:]:
+        parts += [comma, field]
+    parts.append(np.broadcast_to(terminator, (rows, len(terminator))))
+    lines = np.hstack(parts).ravel()
+    return lines[lines != 0].tobytes()
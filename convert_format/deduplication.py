@@ -0,0 +1,181 @@
+"""
+This module drops the trades which appear in several converted files, as
+happens when overlapping exports of the same account are converted.
+
+A row is a duplicate if an earlier file has the same row. Identical rows
+within a file are legitimate (two fills of the same price and amount in
+the same second), so they're counted: the second copy of a row in a file
+is a duplicate only if an earlier file has two copies too.
+
+The converted files are written by the same writer, so the same trade is
+the same line of CSV in all of them, and the lines are compared as they
+are, without being parsed. To deduplicate any number of rows in bounded
+memory, the 64-bit hashes of the lines are first spilled to bucket files
+on disk, by their top bits. Each bucket is then small enough to find its
+duplicates in memory, and the files are finally rewritten without them,
+a block at a time.
+"""
+import os
+import pathlib
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from formats import all_columns
+from incremental import OCCURRENCE_MULTIPLIER
+
+
+DeduplicationResult = namedtuple("DeduplicationResult", "file, rows, duplicates")
+
+BLOCK_SIZE = 16 * 2 ** 20
+BUCKET_BITS = 8
+RECORD = np.dtype([("hash", np.uint64), ("file", np.uint32), ("row", np.uint64)])
+QUOTE = b'"'
+
+
+def deduplicate(files, block_size: int = BLOCK_SIZE, directory=None) -> list:
+    """Drops the rows of each converted CSV file which an earlier file
+    already has, rewriting the files in place. The temporary buckets are
+    kept in the given directory, or in the system's temporary one.
+
+    Returns the number of rows and of duplicates of each file.
+    """
+    files = [pathlib.Path(file) for file in files]
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        scratch = pathlib.Path(scratch)
+        sizes = _spill_hashes(files, block_size, scratch)
+        for bucket in range(1 << BUCKET_BITS):
+            _find_duplicates(scratch / f"bucket-{bucket}", scratch)
+        results = []
+        for index, file in enumerate(files):
+            duplicates = _load_rows(scratch / f"duplicates-{index}")
+            if len(duplicates):
+                _rewrite(file, duplicates, block_size)
+            results.append(DeduplicationResult(file, sizes[index], len(duplicates)))
+    return results
+
+
+def read_records(file: pathlib.Path, block_size: int = BLOCK_SIZE):
+    """Reads the converted file's header and then yields its rows, as
+    arrays of lines, a block at a time. The lines keep a carriage return
+    which precedes their line feed.
+    """
+    with open(file, "rb") as f:
+        header = f.readline()
+        if header.rstrip(b"\r\n").decode() != ",".join(all_columns):
+            raise ValueError(f"{file} isn't a converted file.")
+        yield header
+        remainder = b""
+        while True:
+            block = f.read(block_size)
+            data = remainder + block
+            end = data.rfind(b"\n") + 1
+            # A quoted field may span lines, so a block ends only where
+            # its quotes are balanced
+            while end and data.count(QUOTE, 0, end) % 2:
+                end = data.rfind(b"\n", 0, end - 1) + 1
+            if not block:
+                end = len(data)
+            if end:
+                lines = data[:end].split(b"\n")
+                if lines[-1] == b"":
+                    del lines[-1]
+                if QUOTE in data[:end]:
+                    lines = _join_quoted(lines)
+                yield np.array(lines, dtype=object)
+            remainder = data[end:]
+            if not block:
+                return
+
+
+def _join_quoted(lines: list) -> list:
+    """Joins the lines of the rows whose quoted fields span lines."""
+    records = []
+    pending = None
+    for line in lines:
+        if pending is not None:
+            pending += b"\n" + line
+            if line.count(QUOTE) % 2:
+                records.append(pending)
+                pending = None
+        elif line.count(QUOTE) % 2:
+            pending = line
+        else:
+            records.append(line)
+    return records
+
+
+def _spill_hashes(files, block_size: int, scratch: pathlib.Path) -> list:
+    """Appends the hash, file and row number of every row to the bucket
+    of its hash, and returns the number of rows of each file.
+    """
+    shift = np.uint64(64 - BUCKET_BITS)
+    sizes = []
+    for index, file in enumerate(files):
+        blocks = read_records(file, block_size)
+        next(blocks)
+        size = 0
+        for lines in blocks:
+            records = np.empty(len(lines), RECORD)
+            records["hash"] = pd.util.hash_array(lines, categorize=False)
+            records["file"] = index
+            records["row"] = np.arange(size, size + len(lines))
+            size += len(lines)
+            buckets = records["hash"] >> shift
+            order = np.argsort(buckets, kind="stable")
+            records, buckets = records[order], buckets[order]
+            bounds = np.searchsorted(buckets, np.arange((1 << BUCKET_BITS) + 1))
+            for bucket in np.flatnonzero(np.diff(bounds)):
+                with open(scratch / f"bucket-{bucket}", "ab") as f:
+                    records[bounds[bucket] : bounds[bucket + 1]].tofile(f)
+        sizes.append(size)
+    return sizes
+
+
+def _find_duplicates(bucket: pathlib.Path, scratch: pathlib.Path):
+    """Appends the rows of the bucket which are duplicates to the list of
+    duplicates of their file.
+    """
+    if not bucket.exists():
+        return
+    records = np.fromfile(bucket, RECORD)
+    bucket.unlink()
+    # The records are in the order of the files and of their rows, so
+    # numbering the copies of a hash in each file and keeping the first
+    # of each numbered copy keeps the earliest file's
+    hashes = records["hash"]
+    copies = pd.DataFrame({"hash": hashes, "file": records["file"]})
+    copies = copies.groupby(["hash", "file"], sort=False).cumcount().to_numpy()
+    numbered = pd.util.hash_array(hashes ^ (copies.astype(np.uint64) * OCCURRENCE_MULTIPLIER))
+    duplicates = records[pd.Series(numbered).duplicated().to_numpy()]
+    for index in np.unique(duplicates["file"]):
+        rows = duplicates["row"][duplicates["file"] == index]
+        with open(scratch / f"duplicates-{index}", "ab") as f:
+            rows.tofile(f)
+
+
+def _load_rows(fname: pathlib.Path) -> np.ndarray:
+    if not fname.exists():
+        return np.empty(0, np.uint64)
+    return np.sort(np.fromfile(fname, np.uint64))
+
+
+def _rewrite(file: pathlib.Path, duplicates: np.ndarray, block_size: int):
+    """Rewrites the file without the given rows, replacing it only once
+    it's complete.
+    """
+    temporary = file.with_name(file.name + ".tmp")
+    blocks = read_records(file, block_size)
+    start = 0
+    with open(temporary, "wb") as f:
+        f.write(next(blocks))
+        for lines in blocks:
+            rows = np.arange(start, start + len(lines), dtype=np.uint64)
+            start += len(lines)
+            positions = np.minimum(np.searchsorted(duplicates, rows), len(duplicates) - 1)
+            kept = lines[duplicates[positions] != rows]
+            if len(kept):
+                f.write(b"\n".join(kept) + b"\n")
+    os.replace(temporary, file)
@@ -0,0 +1,455 @@
+"""
+This module contains the formats of the supported tables - the columns
+that identify each of them - and the registry of their converters.
+
+It doesn't import any of the heavy libraries the conversion itself
+needs. The converters are only imported when a table is identified.
+"""
+import importlib
+from collections import namedtuple
+
+
+mandatory_columns = ["Date", "Action", "Symbol", "Volume", "Currency"]
+all_columns = mandatory_columns + ["Account", "Total", "Price", "Fee", "FeeCurrency"]
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+
+CONVERTERS_MODULE = "table_handler"
+
+ISO_FORMAT = "%Y-%m-%d %H:%M:%S"
+US_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+FLOAT = "float64"
+CATEGORY = "category"
+
+# The converter of each format, the format of its timestamps if they have
+# a single known format, and the columns its converter needs. The rest of
+# the format's columns are optional. Day-first timestamps (Bitfinex, Liqui)
+# are left to pandas' inference, which reads them month-first when it can,
+# so that their conversion stays the same.
+# Each format also has a read schema: the dtypes of its required columns
+# and the columns holding percentages ("0.1%"), which are read as numbers.
+TableFormat = namedtuple(
+    "TableFormat",
+    "converter, date_format, required, dtypes, percent_columns",
+    defaults=(None, ()),
+)
+
+binance0 = (
+    "Date(UTC)",
+    "Market",
+    "Type",
+    "Price",
+    "Amount",
+    "Total",
+    "Fee",
+    "Fee Coin",
+)
+bit2c0 = (
+    "Date",
+    "Action",
+    "firstCoin",
+    "Currency",
+    "Volume",
+    "Price",
+    "Fee",
+    "FeeCurrency",
+    "Source",
+)
+
+bit2c1 = (
+    "id",
+    "created",
+    "accountAction",
+    "firstCoin",
+    "secondCoin",
+    "firstAmount",
+    "secondAmount",
+    "price",
+    "feeAmount",
+    "fee",
+    "ref",
+)
+
+bit2c2 = (
+    "id",
+    "created",
+    "accountAction",
+    "firstCoin",
+    "secondCoin",
+    "firstAmount",
+    "secondAmount",
+    "price",
+    "feeAmount",
+    "fee",
+    "balance1",
+    "balance2",
+    "ref",
+)
+
+bitfinex0 = ("#", "PAIR", "AMOUNT", "PRICE", "FEE", "FEE CURRENCY", "DATE", "ORDER ID")
+bittrex0 = (
+    "Uuid",
+    "Exchange",
+    "TimeStamp",
+    "OrderType",
+    "Limit",
+    "Quantity",
+    "QuantityRemaining",
+    "Commission",
+    "Price",
+    "PricePerUnit",
+    "IsConditional",
+    "Condition",
+    "ConditionTarget",
+    "ImmediateOrCancel",
+    "Closed",
+)
+cex0 = (
+    "DateUTC",
+    "Amount",
+    "Symbol",
+    "Balance",
+    "Type",
+    "Pair",
+    "FeeSymbol",
+    "FeeAmount",
+    "Comment",
+)
+exodus0 = (
+    "DATE",
+    "TYPE",
+    "OUTAMOUNT",
+    "OUTCURRENCY",
+    "FEEAMOUNT",
+    "FEECURRENCY",
+    "OUTTXID",
+    "OUTTXURL",
+    "INAMOUNT",
+    "INCURRENCY",
+    "INTXID",
+    "INTXURL",
+    "ORDERID",
+)
+ledgers0 = (
+    "txid",
+    "refid",
+    "time",
+    "type",
+    "aclass",
+    "asset",
+    "amount",
+    "fee",
+    "balance",
+)
+lqui0 = (
+    "Date",
+    "Market",
+    "Type",
+    "Price",
+    "Amount",
+    "Total",
+    "Fee",
+    "OrderId",
+    "TradeId",
+    "Change Base",
+    " Change Quote",
+)
+member0 = (
+    "Symbol",
+    "Currency",
+    "Action",
+    "Volume",
+    "PRICE",
+    "FEE",
+    "FEECURRENCY",
+    "DATE",
+    "Source",
+)
+shapeshift0 = (
+    "כמות רכישה",
+    "מטבע רכישה",
+    "כמות מכירה",
+    "מטבע מכירה",
+    "עמלה (אופציונלי)",
+    "מטבע עמלה (אופציונלי)",
+    "זירה",
+    "אסמכתא (אופציונלי)",
+    "תאריך",
+)
+trade0 = (
+    "Date",
+    "Market",
+    "Category",
+    "Type",
+    "Price",
+    "Amount",
+    "Total",
+    "Fee",
+    "Order Number",
+    "Base Total Less Fee",
+    "Quote Total Less Fee",
+)
+
+trade1 = (
+    "Date",
+    "Market",
+    "Category",
+    "Type",
+    "Price",
+    "Amount",
+    "Total",
+    "Fee",
+    "Order Number",
+    "Base Total Less Fee",
+    "Quote Total Less Fee",
+    "Fee Currency",
+    "Fee Total",
+)
+
+trades0 = (
+    "Date (UTC)",
+    "Instrument",
+    "Trade ID",
+    "Order ID",
+    "Side",
+    "Quantity",
+    "Price",
+    "Volume",
+    "Fee",
+    "Rebate",
+    "Total",
+)
+
+idex0 = (
+    "Date",
+    "Type",
+    "Asset",
+    "Name",
+    "Amount",
+    "Status",
+)
+
+idex1 = (
+    'transactionId',
+    'transactionHash',
+    'date',
+    'market',
+    'makerOrTaker',
+    'buyOrSell',
+    'tokenAmount',
+    'etherAmount',
+    'usdValue',
+    'fee',
+    'gasFee',
+    'feesPaidIn',
+)
+
+
+table_origin = {
+    binance0: TableFormat(
+        "convert_binance0",
+        ISO_FORMAT,
+        ("Date(UTC)", "Type", "Price", "Amount", "Total", "Fee", "Fee Coin"),
+        {"Price": FLOAT, "Amount": FLOAT, "Total": FLOAT, "Fee": FLOAT},
+    ),
+    bit2c0: TableFormat(
+        "convert_bit2c0",
+        ISO_FORMAT,
+        bit2c0[:-1],
+        {"Action": CATEGORY, "Volume": FLOAT, "Price": FLOAT, "Fee": FLOAT},
+    ),
+    bit2c1: TableFormat(
+        "convert_bit2c1",
+        ISO_FORMAT,
+        ("created", "accountAction", "firstCoin", "secondCoin", "firstAmount")
+        + ("price", "feeAmount"),
+        {
+            "accountAction": CATEGORY,
+            "firstAmount": FLOAT,
+            "price": FLOAT,
+            "feeAmount": FLOAT,
+        },
+    ),
+    bit2c2: TableFormat(
+        "convert_bit2c1",
+        ISO_FORMAT,
+        ("created", "accountAction", "firstCoin", "secondCoin", "firstAmount")
+        + ("price", "feeAmount", "balance1", "balance2"),
+        {
+            "accountAction": CATEGORY,
+            "firstAmount": FLOAT,
+            "price": FLOAT,
+            "feeAmount": FLOAT,
+        },
+    ),
+    bitfinex0: TableFormat(
+        "convert_bitfinex0",
+        None,
+        ("PAIR", "AMOUNT", "PRICE", "FEE", "FEE CURRENCY", "DATE"),
+        {"PAIR": CATEGORY, "AMOUNT": FLOAT, "PRICE": FLOAT, "FEE": FLOAT},
+    ),
+    bittrex0: TableFormat(
+        "convert_bittrex0",
+        US_FORMAT,
+        ("Exchange", "TimeStamp", "OrderType", "Quantity", "Price", "PricePerUnit"),
+        {
+            "Exchange": CATEGORY,
+            "OrderType": CATEGORY,
+            "Quantity": FLOAT,
+            "Price": FLOAT,
+            "PricePerUnit": FLOAT,
+        },
+    ),
+    cex0: TableFormat(
+        "convert_cex0",
+        "%m/%d/%y %I:%M %p",
+        ("DateUTC", "Amount", "Symbol", "Type", "Comment"),
+        {"Amount": FLOAT, "Symbol": CATEGORY, "Type": CATEGORY},
+    ),
+    exodus0: TableFormat("convert_exodus0", None, exodus0),
+    ledgers0: TableFormat(
+        "convert_ledgers0",
+        ISO_FORMAT,
+        ("refid", "time", "type", "asset", "amount", "fee"),
+        {"type": CATEGORY, "amount": FLOAT, "fee": FLOAT},
+    ),
+    lqui0: TableFormat(
+        "convert_lqui0",
+        None,
+        ("Date", "Market", "Type", "Price", "Amount", "Total", "Fee", "TradeId"),
+        {"Market": CATEGORY, "Price": FLOAT, "Amount": FLOAT, "Total": FLOAT},
+        ("Fee",),
+    ),
+    member0: TableFormat(
+        "convert_member0",
+        ISO_FORMAT,
+        member0[:-1],
+        {
+            "Action": CATEGORY,
+            "Volume": FLOAT,
+            "PRICE": FLOAT,
+            "FEE": FLOAT,
+        },
+    ),
+    shapeshift0: TableFormat(
+        "convert_shapeshift0",
+        US_FORMAT,
+        ("כמות רכישה", "מטבע רכישה", "כמות מכירה", "מטבע מכירה", "זירה", "תאריך"),
+        {"כמות רכישה": FLOAT, "כמות מכירה": FLOAT},
+    ),
+    trade0: TableFormat(
+        "convert_trade0",
+        ISO_FORMAT,
+        ("Date", "Market", "Type", "Price", "Amount", "Total", "Fee", "Order Number"),
+        {
+            "Market": CATEGORY,
+            "Type": CATEGORY,
+            "Price": FLOAT,
+            "Amount": FLOAT,
+            "Total": FLOAT,
+        },
+        ("Fee",),
+    ),
+    trade1: TableFormat(
+        "convert_trade1",
+        ISO_FORMAT,
+        ("Date", "Market", "Type", "Price", "Amount", "Total", "Fee", "Order Number")
+        + ("Fee Currency", "Fee Total"),
+        {
+            "Market": CATEGORY,
+            "Type": CATEGORY,
+            "Price": FLOAT,
+            "Amount": FLOAT,
+            "Total": FLOAT,
+            "Fee Total": FLOAT,
+        },
+        ("Fee",),
+    ),
+    trades0: TableFormat(
+        "convert_trades0",
+        ISO_FORMAT,
+        ("Date (UTC)", "Instrument", "Side", "Quantity", "Price", "Volume", "Fee")
+        + ("Rebate", "Total"),
+        {
+            "Instrument": CATEGORY,
+            "Side": CATEGORY,
+            "Quantity": FLOAT,
+            "Price": FLOAT,
+            "Volume": FLOAT,
+            "Fee": FLOAT,
+            "Rebate": FLOAT,
+            "Total": FLOAT,
+        },
+    ),
+    idex0: TableFormat("convert_idex0", ISO_FORMAT, idex0),
+    idex1: TableFormat(
+        "convert_idex1",
+        ISO_FORMAT,
+        ("date", "market", "buyOrSell", "etherAmount", "fee", "feesPaidIn"),
+        {
+            "market": CATEGORY,
+            "buyOrSell": CATEGORY,
+            "etherAmount": FLOAT,
+            "fee": FLOAT,
+        },
+    ),
+}
+
+# Converters which convert each row on its own, so a table can be converted
+# in chunks.
+streamable_converters = {
+    "convert_binance0",
+    "convert_bit2c0",
+    "convert_bit2c1",
+    "convert_bitfinex0",
+    "convert_bittrex0",
+    "convert_lqui0",
+    "convert_member0",
+    "convert_trade0",
+    "convert_trade1",
+    "convert_trades0",
+    "convert_idex1",
+}
+# Converters which fetch the rates they're missing, and take the number of
+# threads which fetch them.
+rate_converters = {"convert_shapeshift0"}
+
+
+def load_converter(name: str):
+    """Imports the converters' module, if it wasn't imported yet,
+    and returns the converter with the given name.
+    """
+    return getattr(importlib.import_module(CONVERTERS_MODULE), name)
+
+
+def identify_format(columns) -> TableFormat:
+    """Returns the format of a table with the given columns.
+
+    A table whose columns are exactly those of a format is of that
+    format. Otherwise, every format whose required columns are all
+    present is scored by the number of its columns that are present,
+    minus the number of columns that aren't part of it, and the best
+    scoring format is returned. Raises a KeyError if no format fits.
+    """
+    columns = tuple(columns)
+    try:
+        return table_origin[columns]
+    except KeyError:
+        pass
+    present = set(columns)
+    best_format, best_score = None, None
+    for signature, table_format in table_origin.items():
+        if not present.issuperset(table_format.required):
+            continue
+        score = len(present.intersection(signature))
+        score -= len(present.difference(signature))
+        if best_score is None or score > best_score:
+            best_format, best_score = table_format, score
+    if best_format is None:
+        raise KeyError(columns)
+    return best_format
+
+
+def identify_table_origin(columns):
+    return load_converter(identify_format(columns).converter)
@@ -0,0 +1,150 @@
+"""
+This module keeps the manifests of incremental conversions, which record
+the rows that were already converted into a directory, so that converting
+a newer, cumulative export of the same account only adds its new rows.
+
+A row is known by its fingerprint, a 64-bit hash of its values. Identical
+rows are legitimate (two fills of the same price and amount in the same
+second), so the fingerprints of the rows read from a file are numbered by
+their occurrence: the second copy of a row in an export has the same
+fingerprint as the second copy in the next export, but not as the first.
+
+Two manifests are kept under the directory's ``_manifest`` subdirectory:
+the fingerprints of the rows read from the exports of each format, which
+let converters that convert each row on its own skip the rows they saw,
+and the fingerprints of the converted rows of each account, with the
+number of copies of each, which the other converters' output is checked
+against.
+"""
+import os
+import pathlib
+import re
+
+import numpy as np
+import pandas as pd
+
+
+MANIFEST_DIR = "_manifest"
+SOURCES_DIR = "sources"
+ACCOUNTS_DIR = "accounts"
+UNKNOWN_ACCOUNT = "unknown"
+# Spreads the occurrence numbers over the hash's bits
+OCCURRENCE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def row_hashes(data: pd.DataFrame) -> np.ndarray:
+    """Returns a 64-bit hash of each row's values."""
+    return pd.util.hash_pandas_object(data, index=False).to_numpy(np.uint64)
+
+
+def occurrences(hashes: np.ndarray) -> np.ndarray:
+    """Numbers the copies of each hash, in the order they appear."""
+    return pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy()
+
+
+def fingerprints(data: pd.DataFrame) -> np.ndarray:
+    """Returns the fingerprints of the rows, numbered by occurrence."""
+    hashes = row_hashes(data)
+    numbered = hashes ^ (occurrences(hashes).astype(np.uint64) * OCCURRENCE_MULTIPLIER)
+    return pd.util.hash_array(numbered)
+
+
+def account_name(account) -> str:
+    """Returns the name of the account's files."""
+    if pd.isna(account) or str(account) == "":
+        return UNKNOWN_ACCOUNT
+    return re.sub(r"[^\w.-]", "_", str(account))
+
+
+class Manifest:
+    """The fingerprints of the rows which were converted into a directory.
+
+    Changes are kept in memory until ``save()`` is called, which is done
+    after the converted rows were written: a failure in between converts
+    the rows again next time rather than losing them.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory) / MANIFEST_DIR
+        self._sources = {}
+        self._accounts = {}
+        self._changed = set()
+
+    def new_sources(self, source: str, fingerprints: np.ndarray) -> np.ndarray:
+        """Returns which of the rows read from an export of the given
+        format weren't converted yet.
+        """
+        known = self._load_source(source)
+        return ~_contains(known, fingerprints)
+
+    def add_sources(self, source: str, fingerprints: np.ndarray):
+        known = self._load_source(source)
+        self._sources[source] = np.union1d(known, fingerprints)
+        self._changed.add((SOURCES_DIR, source))
+
+    def new_rows(self, account: str, hashes: np.ndarray) -> np.ndarray:
+        """Returns which of the converted rows of the account are new
+        copies: the ones beyond the number of copies converted before.
+        """
+        known, counts = self._load_account(account)
+        converted = np.zeros(len(hashes), dtype=np.int64)
+        found = _contains(known, hashes)
+        converted[found] = counts[np.searchsorted(known, hashes[found])]
+        return occurrences(hashes) >= converted
+
+    def add_rows(self, account: str, hashes: np.ndarray):
+        """Adds the copies of the converted rows of the account."""
+        known, counts = self._load_account(account)
+        added, added_counts = np.unique(hashes, return_counts=True)
+        merged = np.union1d(known, added)
+        merged_counts = np.zeros(len(merged), dtype=np.int64)
+        merged_counts[np.searchsorted(merged, known)] += counts
+        merged_counts[np.searchsorted(merged, added)] += added_counts
+        self._accounts[account] = (merged, merged_counts)
+        self._changed.add((ACCOUNTS_DIR, account))
+
+    def save(self):
+        """Writes the changed manifests, each atomically."""
+        for kind, name in sorted(self._changed):
+            path = self.directory / kind / (name + ".npz")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if kind == SOURCES_DIR:
+                arrays = {"fingerprints": self._sources[name]}
+            else:
+                known, counts = self._accounts[name]
+                arrays = {"fingerprints": known, "counts": counts}
+            temporary = path.with_suffix(".tmp.npz")
+            np.savez(temporary, **arrays)
+            os.replace(temporary, path)
+        self._changed.clear()
+
+    def _load_source(self, source: str) -> np.ndarray:
+        if source not in self._sources:
+            arrays = self._load(SOURCES_DIR, source)
+            known = np.empty(0, np.uint64) if arrays is None else arrays["fingerprints"]
+            self._sources[source] = known
+        return self._sources[source]
+
+    def _load_account(self, account: str):
+        if account not in self._accounts:
+            arrays = self._load(ACCOUNTS_DIR, account)
+            if arrays is None:
+                self._accounts[account] = (np.empty(0, np.uint64), np.empty(0, np.int64))
+            else:
+                self._accounts[account] = (arrays["fingerprints"], arrays["counts"])
+        return self._accounts[account]
+
+    def _load(self, kind: str, name: str):
+        try:
+            with np.load(self.directory / kind / (name + ".npz")) as arrays:
+                return {key: arrays[key] for key in arrays.files}
+        except FileNotFoundError:
+            return None
+
+
+def _contains(known: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Checks which values are in the sorted array."""
+    if len(known) == 0:
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(known, values), len(known) - 1)
+    return known[positions] == values
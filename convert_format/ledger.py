@@ -0,0 +1,195 @@
+"""
+Merges converted files into a single chronological ledger, tagging each
+row with the file it came from.
+
+    python ledger.py ledger.csv exports/*_converted.csv
+
+The files are merged like an external k-way merge, without loading them:
+each file is read a block at a time, and every round writes out all of
+the rows, from all of the blocks, that are up to the earliest of the
+blocks' last dates, which no row yet to be read can precede. Memory
+therefore depends on the number of files, not on their size. Files whose
+rows aren't in chronological order (many exchanges export the newest
+trades first) are sorted first, one at a time, by sorting each block
+into a run and merging the runs the same way.
+
+Rows are compared by their dates as written, which the converters write
+as UTC in a fixed-width, sortable layout, and otherwise copied as they are.
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+
+import numpy as np
+
+from csv_writer import LINE_TERMINATOR, SPECIAL_CHARACTERS, quote
+from deduplication import BLOCK_SIZE, read_records
+from formats import all_columns
+
+
+SOURCE_COLUMN = "Source"
+# The date and time, without the offset, which is always UTC
+KEY_DTYPE = "S19"
+# The least that is read from each sorted run at a time while merging them
+MIN_RUN_BLOCK_SIZE = 2 ** 16
+
+
+def merge_files(files, output, block_size: int = BLOCK_SIZE, directory=None) -> int:
+    """Merges the converted CSV files into the output by date, adding the
+    name of each row's file as its source. The files which aren't sorted
+    by date are sorted into the given temporary directory first.
+
+    Returns the number of merged rows.
+    """
+    files = [pathlib.Path(file) for file in files]
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        streams = []
+        for index, file in enumerate(files):
+            source = file
+            if not is_sorted(file, block_size):
+                source = pathlib.Path(scratch) / f"{index}.csv"
+                sort_file(file, source)
+            streams.append(_Stream(source, _tag(file.name), block_size))
+        return _merge(streams, output)
+
+
+def is_sorted(file: pathlib.Path, block_size: int = BLOCK_SIZE) -> bool:
+    """Checks whether the converted file's rows are in chronological order."""
+    blocks = read_records(file, block_size)
+    next(blocks)
+    previous = None
+    for lines in blocks:
+        keys = _keys(lines)
+        if np.any(keys[1:] < keys[:-1]):
+            return False
+        if previous is not None and len(keys) and keys[0] < previous:
+            return False
+        if len(keys):
+            previous = keys[-1]
+    return True
+
+
+def sort_file(
+    file: pathlib.Path, destination: pathlib.Path, block_size: int = BLOCK_SIZE
+):
+    """Writes the converted file's rows in chronological order. Rows of
+    the same date keep their order.
+
+    Each block of the file is sorted into a run of its own, next to the
+    destination, and the runs are then merged, so that only a block of
+    rows is in memory at a time however the file is ordered.
+    """
+    with tempfile.TemporaryDirectory(dir=pathlib.Path(destination).parent) as scratch:
+        blocks = read_records(file, block_size)
+        header = next(blocks)
+        runs = []
+        for lines in blocks:
+            if not len(lines):
+                continue
+            lines = lines[np.argsort(_keys(lines), kind="stable")]
+            runs.append(pathlib.Path(scratch) / f"{len(runs)}.csv")
+            with open(runs[-1], "wb") as f:
+                f.write(header)
+                f.write(b"\n".join(lines) + b"\n")
+        # The runs share the block's worth of memory while they're merged
+        run_block_size = max(block_size // max(len(runs), 1), MIN_RUN_BLOCK_SIZE)
+        streams = [_Stream(run, b"\n", run_block_size) for run in runs]
+        with open(destination, "wb") as f:
+            f.write(header)
+            for lines in _merged(streams):
+                f.write(b"".join(lines))
+
+
+def _keys(lines: np.ndarray) -> np.ndarray:
+    # Converting to fixed-width bytes keeps the start of each line
+    return np.array(lines, dtype=KEY_DTYPE)
+
+
+def _tag(name: str) -> bytes:
+    """Returns the end of the rows of the given file: its name as an
+    additional field, and the line's end.
+    """
+    if any(character in name for character in SPECIAL_CHARACTERS):
+        name = quote(name)
+    return ("," + name + LINE_TERMINATOR).encode()
+
+
+class _Stream:
+    """The rows of a file which were read and not merged yet."""
+
+    def __init__(self, file: pathlib.Path, tag: bytes, block_size: int):
+        self.tag = tag
+        self._blocks = read_records(file, block_size)
+        next(self._blocks)
+        self.lines = np.empty(0, object)
+        self.keys = np.empty(0, KEY_DTYPE)
+        self.done = False
+
+    def refill(self):
+        """Reads the next block, if the previous one was merged."""
+        while len(self.lines) == 0 and not self.done:
+            lines = next(self._blocks, None)
+            if lines is None:
+                self.done = True
+                return
+            # Lines written on Windows end with a carriage return
+            if len(lines) and lines[0].endswith(b"\r"):
+                lines = np.array([line[:-1] for line in lines], dtype=object)
+            self.lines, self.keys = lines, _keys(lines)
+
+    def take(self, bound: bytes):
+        """Removes and returns the rows up to the bound, and their keys."""
+        end = np.searchsorted(self.keys, bound, side="right")
+        taken = self.lines[:end], self.keys[:end]
+        self.lines, self.keys = self.lines[end:], self.keys[end:]
+        return taken
+
+
+def _merge(streams: list, output) -> int:
+    header = ",".join(all_columns + [SOURCE_COLUMN]) + LINE_TERMINATOR
+    merged = 0
+    with open(output, "wb") as f:
+        f.write(header.encode())
+        for lines in _merged(streams):
+            f.write(b"".join(lines))
+            merged += len(lines)
+    return merged
+
+
+def _merged(streams: list):
+    """Yields the streams' rows in chronological order, followed by their
+    stream's tag, a round at a time. Rows of the same date come in the
+    order of their streams.
+    """
+    while True:
+        for stream in streams:
+            stream.refill()
+        pending = [stream for stream in streams if len(stream.lines)]
+        if not pending:
+            return
+        # Rows after the last one read from a file may still come before
+        # the rest of the other files' rows
+        unfinished = [stream.keys[-1] for stream in pending if not stream.done]
+        bound = min(unfinished) if unfinished else max(s.keys[-1] for s in pending)
+        lines, keys = [], []
+        for stream in pending:
+            taken_lines, taken_keys = stream.take(bound)
+            lines.append(taken_lines + stream.tag)
+            keys.append(taken_keys)
+        lines = np.concatenate(lines)
+        order = np.argsort(np.concatenate(keys), kind="stable")
+        yield lines[order]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", type=pathlib.Path, help="The merged ledger")
+    parser.add_argument("files", nargs="+", type=pathlib.Path, help="Converted files")
+    args = parser.parse_args(argv)
+    rows = merge_files(args.files, args.output)
+    print(f"Merged {rows} rows of {len(args.files)} files into {args.output}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,118 @@
 import pathlib
+import queue
+import threading
 
 import PySimpleGUI as sg
 
-from pipeline import run
+# How often the window checks on the conversions, in milliseconds
+POLL_INTERVAL = 100
+# The bar moves a step for each stage of a conversion: identifying the
+# format, reading, converting, categorizing, reordering, filtering,
+# replacing and writing
+STAGES_PER_FILE = 8
 
 
-def convert_button(fname) -> str:
-    result = run(fname)
-    return result
+def convert_button(fname, progress=None, cancelled=None) -> str:
+    # Imported here so that the window shows up before pandas is loaded
+    from pipeline import DEFAULT_CHUNKSIZE, convert
+    from profiling import format_timings
+
+    # Converting in chunks where possible lets a conversion be cancelled
+    # between them
+    result = convert(fname, DEFAULT_CHUNKSIZE, progress=progress, cancelled=cancelled)
+    if not result.stages:
+        return result.summary
+    return result.summary + "\n\n" + format_timings(result.stages)
+
+
+def convert_files(files: queue.Queue, events: queue.Queue):
+    """Converts the queued files one after the other, posting each one's
+    start, progress and summary as events to the window. Runs in a
+    background thread, so that the window keeps responding.
+
+    Each file is queued with the event which cancels it, so that a file
+    queued after a Cancel isn't cancelled by it, and a Cancel is never
+    missed between two files.
+    """
+    while True:
+        fname, cancelled = files.get()
+        events.put(("started", fname, None))
+        try:
+            summary = convert_button(
+                fname, lambda progress: events.put(("progress", fname, progress)), cancelled
+            )
+        except Exception as e:  # the window must hear of every file's end
+            summary = f"Internal Error. Please contact the application's author.\n{e}"
+        events.put(("done", fname, summary))
 
 
 sg.theme('Light Blue 2')
 
 conversion_summary = "No files were loaded"
-dispatch_dict = {'Convert': convert_button}
-layout = [[sg.Text('Choose a file to convert:')],
-          [sg.Text('Filename', size=(8, 1)), sg.Input(size=(50, 1)), sg.FileBrowse()],
+layout = [[sg.Text('Choose files to convert:')],
+          [sg.Text('Filename', size=(8, 1)), sg.Input(size=(50, 1)), sg.FilesBrowse()],
+          [sg.Text("", key="status", size=(100, 1))],
+          [sg.ProgressBar(STAGES_PER_FILE, orientation='h', size=(60, 20), key="progress")],
           [sg.Text("Results:")],
-          [sg.Text(conversion_summary, key="summary", size=(100, 10), background_color='white', font=('Helvetica', 16))],
-          [sg.Button('Convert'), sg.Quit()]]
+          [sg.Multiline(conversion_summary, key="summary", size=(100, 20), disabled=True, background_color='white', font=('Helvetica', 16))],
+          [sg.Button('Convert'), sg.Button('Cancel'), sg.Quit()]]
 
 window = sg.Window("Helbaz's Cointrader Converter ", layout)
 
+pending = queue.Queue()
+events = queue.Queue()
+# Cancels the files queued since the last Cancel
+cancelled = threading.Event()
+threading.Thread(target=convert_files, args=(pending, events), daemon=True).start()
+# The files queued since the queue was last empty, and how many of them ended
+queued, done = 0, 0
+stages_done = set()
+# The summaries of the files which ended, shown together
+summaries = []
+
 while True:
-    event, value = window.read()
+    event, value = window.read(timeout=POLL_INTERVAL)
     if event in ('Quit', None):
+        cancelled.set()
         break
-    if event in dispatch_dict:
-        conversion_summary = dispatch_dict[event](pathlib.Path(value[0]))
-        window["summary"].update(conversion_summary)
+    if event == 'Convert' and value[0]:
+        if queued == done:
+            queued, done = 0, 0
+            summaries.clear()
+        if cancelled.is_set():
+            cancelled = threading.Event()
+        for fname in value[0].split(";"):
+            pending.put((pathlib.Path(fname), cancelled))
+            queued += 1
+    if event == 'Cancel':
+        # Drops the files which didn't start, and stops the current one. The
+        # worker may take the last file meanwhile, so the queue isn't
+        # waited on
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                break
+            queued -= 1
+        cancelled.set()
+    while not events.empty():
+        kind, fname, content = events.get()
+        if kind == "started":
+            stages_done.clear()
+            window["status"].update(f"Converting {fname.name} ({done + 1} of {queued})")
+        elif kind == "progress":
+            stages_done.add(content.stage)
+            window["status"].update(
+                f"Converting {fname.name} ({done + 1} of {queued}): "
+                f"{content.stage}, {content.rows} rows"
+            )
+        else:
+            done += 1
+            stages_done.clear()
+            window["status"].update(f"Converted {done} of {queued} files")
+            summaries.append(f"{fname.name}\n{content}")
+            window["summary"].update("\n\n".join(summaries))
+        current = done * STAGES_PER_FILE + min(len(stages_done), STAGES_PER_FILE)
+        window["progress"].update_bar(current, max(queued, 1) * STAGES_PER_FILE)
 
 window.close()
@@ -0,0 +1,95 @@
+"""
+This module splits the markets (trading pairs) of the exchanges' exports,
+like "ETH/BTC", "BTC-ETH" or "ETHBTC", into the coin which was traded and
+the currency it was priced in.
+
+An export has millions of trades but only a few hundred distinct markets,
+so each distinct market is parsed once, and remembered for the next files,
+and the parsed coins are mapped back to the rows by the market's code.
+"""
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+MarketConvention = namedtuple("MarketConvention", "separator, quote_first")
+
+# How each exchange writes its markets. Bittrex puts the currency first
+CONVENTIONS = {
+    "base/quote": MarketConvention("/", False),
+    "base-quote": MarketConvention("-", False),
+    "quote-base": MarketConvention("-", True),
+    "basequote": MarketConvention("", False),
+}
+# The currencies which end the markets written without a separator, longest
+# first so that USDT isn't taken for USD. Kraken's are normalized later
+QUOTE_CURRENCIES = tuple(
+    sorted(
+        {
+            "BTC", "ETH", "BNB", "USD", "USDT", "USDC", "BUSD", "TUSD", "DAI",
+            "EUR", "GBP", "JPY", "ILS", "XBT", "XXBT", "XETH", "ZUSD", "ZEUR",
+            "ZGBP", "ZCAD", "ZJPY",
+        },
+        key=len,
+        reverse=True,
+    )
+)
+# The separators of all of the conventions, which are stripped from markets
+# split at their quote currency
+SEPARATORS = "".join(
+    sorted({convention.separator for convention in CONVENTIONS.values()})
+)
+MEMO_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def parse_market(market: str, convention: str = "base/quote") -> tuple:
+    """Returns the (base, quote) coins of the market. Markets without the
+    convention's separator are split at their known quote currency, at
+    the side of the market the convention puts it, and their quote is
+    None if it isn't known.
+    """
+    separator, quote_first = CONVENTIONS[convention]
+    if separator and separator in market:
+        first, second = market.split(separator)[:2]
+        return (second, first) if quote_first else (first, second)
+    for quote in QUOTE_CURRENCIES:
+        if len(market) <= len(quote):
+            continue
+        if quote_first and market.startswith(quote):
+            base = market[len(quote) :].lstrip(SEPARATORS)
+        elif not quote_first and market.endswith(quote):
+            base = market[: -len(quote)].rstrip(SEPARATORS)
+        else:
+            continue
+        if base:
+            return base, quote
+    return market, None
+
+
+def split_markets(markets: pd.Series, convention: str = "base/quote"):
+    """Returns the base and the quote coin of each row's market, as
+    categorical columns. Missing markets have missing coins.
+    """
+    if convention not in CONVENTIONS:
+        raise KeyError(f"Unknown market convention: {convention}")
+    codes, uniques = pd.factorize(markets)
+    parsed = [
+        parse_market(market, convention) if isinstance(market, str) else (None, None)
+        for market in uniques
+    ]
+    bases, quotes = zip(*parsed) if parsed else ((), ())
+    return (
+        _coins_of_rows(codes, bases, markets.index),
+        _coins_of_rows(codes, quotes, markets.index),
+    )
+
+
+def _coins_of_rows(codes: np.ndarray, coins, index) -> pd.Series:
+    """Maps the coins of the distinct markets back to the rows."""
+    coin_codes, unique_coins = pd.factorize(np.asarray(coins, dtype=object))
+    # -1 picks the missing coin appended last
+    row_codes = np.append(coin_codes, -1)[codes]
+    return pd.Series(pd.Categorical.from_codes(row_codes, unique_coins), index=index)
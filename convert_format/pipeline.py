@@ -1,99 +1,703 @@
+import functools
+import importlib.util
 import pathlib
 from collections import namedtuple
 
+import numpy as np
 import pandas as pd
 
-from table_handler import identify_table_origin, mandatory_columns, all_columns
+from cex_matcher import TooManyCandidates, UnparsedActions
+from formats import (
+    TableFormat,
+    identify_format,
+    load_converter,
+    mandatory_columns,
+    all_columns,
+    rate_converters,
+    streamable_converters,
+)
+from incremental import Manifest, account_name, fingerprints, row_hashes
+from price_cache import RateNotCached
+from profiling import ConversionCancelled, StageRecorder, profiled, write_log
+from sheet_cache import SheetCache, default_cache
+from symbols import categorize, normalize_currencies
+from writers import OUTPUT_FORMATS, TableWriter
+import xlsx_reader
 
 
 FilteredData = namedtuple("FilteredData", "data, illegal")
+# The number of rows of an illegal action, and their row numbers as an
+# array of inclusive (first, last) ranges
+IllegalRows = namedtuple("IllegalRows", "count, ranges")
+# The stages are the time, rows and memory each stage of the conversion took
+ConversionResult = namedtuple(
+    "ConversionResult",
+    "summary, success, original_size, converted_size, illegal, stages",
+    defaults=((),),
+)
 
+DEFAULT_CHUNKSIZE = 100_000
+# Keeps the summary short when millions of rows are illegal
+MAX_FORMATTED_RANGES = 10
 
-def read_data(fname: pathlib.Path):
+# pyarrow's CSV parser is multithreaded, but it can't read in chunks
+CSV_ENGINE = (
+    "pyarrow"
+    if importlib.util.find_spec("pyarrow")
+    # The engine was added in pandas 1.4
+    and importlib.util.find_spec("pandas.io.parsers.arrow_parser_wrapper")
+    else "c"
+)
+
+UNKNOWN_FORMAT_MESSAGE = "Unknown table format. Please contact the application's author."
+INTERNAL_ERROR_MESSAGE = "Internal Error. Please contact the application's author."
+CANCELLED_MESSAGE = "The conversion was cancelled."
+PYARROW_MISSING_MESSAGE = "Writing Parquet and Arrow files needs pyarrow. Please install it (pip install pyarrow) and try again."
+PERMISSION_ERROR_MESSAGE = "Unable to save file in folder. Please make sure it exists and that you have sufficient permissions to write to that directory, and try again."
+
+
+def read_data(fname: pathlib.Path, table_format: TableFormat = None):
     """Reads the data to disk.
-    Input can be a CSV or .XLSX file.
+    Input can be a CSV or .XLSX file. If the format of the file is given,
+    only the columns it needs are read, with the dtypes of its schema.
+    """
+    usecols, dtypes, percent_columns = _read_schema(table_format)
+    if "xls" in fname.suffix:
+        data = read_excel(fname, usecols, dtypes)
+        return _parse_percent_columns(data, percent_columns)
+
+    if "csv" in fname.suffix:
+        try:
+            data = pd.read_csv(
+                fname, header=0, usecols=usecols, dtype=dtypes, engine=CSV_ENGINE
+            )
+        except (ValueError, TypeError):
+            data = pd.read_csv(fname, header=0, usecols=usecols)
+        return _parse_percent_columns(data, percent_columns)
+
+
+def read_excel(
+    fname: pathlib.Path, usecols=None, dtypes=None, cache: SheetCache = None
+) -> pd.DataFrame:
+    """Reads the first sheet of an Excel file. A workbook which was read
+    before with the same schema is loaded from the sheet cache instead.
     """
+    cache = cache or default_cache()
+    if not cache.enabled:
+        return _parse_excel(fname, usecols, dtypes)
+    key = cache.key(fname, (usecols, dtypes))
+    data = cache.get(key)
+    if data is None:
+        data = _parse_excel(fname, usecols, dtypes)
+        cache.put(key, data, fname)
+    return data
+
+
+def _parse_excel(fname: pathlib.Path, usecols, dtypes) -> pd.DataFrame:
+    # The streaming reader handles .xlsx files only
+    reader = xlsx_reader.read_sheet if fname.suffix == ".xlsx" else pd.read_excel
+    try:
+        return reader(fname, usecols=usecols, dtype=dtypes)
+    except (ValueError, TypeError):
+        return reader(fname, usecols=usecols)
+
+
+def _read_schema(table_format: TableFormat = None):
+    """Returns the columns, dtypes and percentage columns to read."""
+    if table_format is None:
+        return None, None, ()
+    return list(table_format.required), table_format.dtypes, table_format.percent_columns
+
+
+def _parse_percent_columns(data: pd.DataFrame, percent_columns) -> pd.DataFrame:
+    """Turns percentages like "0.1%" into numbers, dropping the sign.
+    Fees take only a few distinct values, so each is parsed once.
+    """
+    for column in percent_columns:
+        if data[column].dtype != object:
+            continue
+        codes, uniques = pd.factorize(data[column])
+        numbers = pd.to_numeric(pd.Series(uniques).str.rstrip("%"), errors="coerce")
+        numbers = np.append(numbers.to_numpy(np.float64), np.nan)
+        data[column] = numbers[codes]
+    return data
+
+
+def read_columns(fname: pathlib.Path) -> pd.Index:
+    """Reads only the header of the given file."""
+    if fname.suffix == ".xlsx":
+        return xlsx_reader.read_columns(fname)
+
+    if "xls" in fname.suffix:
+        return pd.read_excel(fname, nrows=0).columns
+
+    if "csv" in fname.suffix:
+        return pd.read_csv(fname, header=0, nrows=0).columns
+
+
+def read_chunks(fname: pathlib.Path, chunksize: int, table_format: TableFormat = None):
+    """Reads the data in chunks of at most chunksize rows, like read_data().
+    CSV and .xlsx files are read lazily. Older Excel files can't be, so
+    the sheet is read whole and then split.
+    """
+    if fname.suffix == ".xlsx":
+        usecols, dtypes, percent_columns = _read_schema(table_format)
+        chunks = xlsx_reader.read_sheet_chunks(fname, chunksize, usecols, dtypes)
+        for chunk in chunks:
+            yield _parse_percent_columns(chunk, percent_columns)
+        return
+
     if "xls" in fname.suffix:
-        return pd.read_excel(fname)
+        data = read_data(fname, table_format)
+        for start in range(0, len(data), chunksize):
+            yield data.iloc[start : start + chunksize].copy()
 
     if "csv" in fname.suffix:
-        return pd.read_csv(fname, header=0)
+        usecols, dtypes, percent_columns = _read_schema(table_format)
+        rows = 0
+        try:
+            chunks = pd.read_csv(
+                fname, header=0, chunksize=chunksize, usecols=usecols, dtype=dtypes
+            )
+            for chunk in chunks:
+                rows += len(chunk)
+                yield _parse_percent_columns(chunk, percent_columns)
+        except (ValueError, TypeError):
+            # Like read_data(), a chunk which doesn't fit the schema is read
+            # untyped, along with the rest of the file
+            chunks = pd.read_csv(
+                fname,
+                header=0,
+                chunksize=chunksize,
+                usecols=usecols,
+                skiprows=range(1, rows + 1),
+            )
+            for chunk in chunks:
+                chunk.index += rows
+                yield _parse_percent_columns(chunk, percent_columns)
+
+
+def sniff_format(fname: pathlib.Path):
+    """Identifies the format of the file from its header alone.
+    Returns None if the file isn't of any known format.
+    """
+    columns = read_columns(fname)
+    if columns is None:
+        return None
+    try:
+        return identify_format(columns)
+    except KeyError:
+        return None
 
 
 def filter_unneeded_rows(data: pd.DataFrame) -> FilteredData:
     """Removes rows which aren't needed in the DF.
     If a row contains one of the designated symbols it drops them and records them.
     Returns an Filtered object which contains information about the retained and
-    removed rows.
+    removed rows: the number of rows of each illegal action, and their row
+    numbers as ranges.
     """
     allowed_values = ["BUY", "SELL"]
-    correct_rows = data["Action"].isin(allowed_values)
-    num_of_ok_rows = correct_rows.sum()
-    if num_of_ok_rows == len(data):
+    correct_rows = data["Action"].isin(allowed_values).to_numpy()
+    if correct_rows.all():
         return FilteredData(data, {})
     legal_rows = data.loc[correct_rows, :]
-    illegal_rows = data.loc[~correct_rows, :]
-    unique_illegal = illegal_rows["Action"].unique()
+    # Grouping the illegal rows by their action in one pass, rather than
+    # scanning the table for each action
+    actions = data["Action"].iloc[np.flatnonzero(~correct_rows)]
+    codes, unique_illegal = pd.factorize(actions)
+    # Rows without an action are keyed by None, which, unlike NaN, equals
+    # itself when the chunks' rows are merged
+    unique_illegal = list(unique_illegal) + [None]
+    codes = np.where(codes < 0, len(unique_illegal) - 1, codes)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(unique_illegal) + 1))
+    row_numbers = (data.index.to_numpy()[~correct_rows] + 1)[order]
     uniques = {}
-    for unique in unique_illegal:
-        values = data.loc[data["Action"] == unique, :]
-        uniques[unique] = (len(values), values.index.to_numpy() + 1)
+    for code, unique in enumerate(unique_illegal):
+        rows = row_numbers[bounds[code] : bounds[code + 1]]
+        if len(rows):
+            uniques[unique] = IllegalRows(len(rows), row_ranges(rows))
     return FilteredData(legal_rows, uniques)
 
 
+def row_ranges(rows: np.ndarray) -> np.ndarray:
+    """Encodes the row numbers as the first and last row of each run of
+    consecutive rows, an array of shape (runs, 2).
+    """
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    if len(rows) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = rows[np.r_[0, breaks]]
+    ends = rows[np.r_[breaks - 1, len(rows) - 1]]
+    return np.column_stack([starts, ends])
+
+
+def merge_ranges(ranges: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Merges two sets of row ranges, joining the overlapping and
+    adjacent ones.
+    """
+    ranges = np.concatenate([ranges, other])
+    if len(ranges) == 0:
+        return ranges
+    ranges = ranges[np.argsort(ranges[:, 0], kind="stable")]
+    # A range starts a new run unless it starts within or right after
+    # the ranges before it
+    reach = np.maximum.accumulate(ranges[:, 1])
+    starts = np.r_[True, ranges[1:, 0] > reach[:-1] + 1]
+    runs = np.cumsum(starts) - 1
+    ends = np.zeros(starts.sum(), dtype=np.int64)
+    np.maximum.at(ends, runs, ranges[:, 1])
+    return np.column_stack([ranges[starts, 0], ends])
+
+
+def format_ranges(ranges: np.ndarray, limit: int = MAX_FORMATTED_RANGES) -> str:
+    """Formats row ranges like "1-500, 730, 900-1200", listing only the
+    first ranges if there are more than the limit.
+    """
+    formatted = [
+        str(start) if start == end else f"{start}-{end}" for start, end in ranges[:limit]
+    ]
+    if len(ranges) > limit:
+        formatted.append(f"and {len(ranges) - limit} more")
+    return ", ".join(formatted)
+
+
 def replace_invalid_currencies(filtered: FilteredData):
-    new_data = filtered.data
-    try:
-        new_data = new_data.replace({'Currency': {'NIS': 'ILS'}})
-    except TypeError:
-        pass
-    try:
-        new_data = new_data.replace({'FeeCurrency': {'NIS': 'ILS'}})
-    except TypeError:
-        pass
-    return FilteredData(new_data, filtered.illegal)
-    
+    """Renames the currencies to their usual names, like ILS for NIS."""
+    return FilteredData(normalize_currencies(filtered.data), filtered.illegal)
+
+
+def merge_illegal(illegal: dict, other: dict) -> dict:
+    """Merges the illegal rows found in two parts of the same table."""
+    merged = dict(illegal)
+    for action, (count, ranges) in other.items():
+        if action in merged:
+            count += merged[action].count
+            ranges = merge_ranges(merged[action].ranges, ranges)
+        merged[action] = IllegalRows(count, ranges)
+    return merged
+
 
 def format_result(filtered: FilteredData, original_size: int) -> str:
     """Formats the result of the computation to a table
     understabable by a lay person.
     """
-    if len(filtered.data) == original_size:
+    return format_summary(len(filtered.data), filtered.illegal, original_size)
+
+
+def format_summary(converted_size: int, illegal: dict, original_size: int) -> str:
+    """Formats the number of converted rows and the illegal ones."""
+    if converted_size == original_size:
         return f"All {original_size} rows were converted successfully."
-    formatted = f"{len(filtered.data)} rows converted successfully. Illegal rows were:\n\n"
-    df = pd.DataFrame(filtered.illegal).transpose()
-    df = df.rename(columns={0: "Number of rows", 1: "Row Index"})
-    df.index.name = 'Action'
-    formatted = formatted + repr(df)
+    formatted = f"{converted_size} rows converted successfully. Illegal rows were:\n\n"
+    return formatted + format_illegal(illegal)
+
+
+def format_incremental_summary(
+    converted_size: int, illegal: dict, known_size: int
+) -> str:
+    """Formats the number of new converted rows, of the rows which were
+    converted before and of the illegal ones.
+    """
+    formatted = (
+        f"{converted_size} new rows converted successfully. "
+        f"{known_size} rows were already converted."
+    )
+    if illegal:
+        formatted += " Illegal rows were:\n\n" + format_illegal(illegal)
     return formatted
 
 
+def format_illegal(illegal: dict, index_name: str = "Action") -> str:
+    df = pd.DataFrame(
+        {
+            "Number of rows": [rows.count for rows in illegal.values()],
+            "Row Index": [format_ranges(rows.ranges) for rows in illegal.values()],
+        },
+        index=pd.Index(list(illegal), name=index_name),
+    )
+    # The ranges are already cut short
+    with pd.option_context("display.max_colwidth", None):
+        return repr(df)
+
+
+def format_unparsed(unparsed: pd.DataFrame) -> str:
+    """Formats the CEX actions whose comments couldn't be parsed like the
+    illegal rows, by the reason they were rejected.
+    """
+    rejected = {}
+    for reason, rows in unparsed.groupby("Reason", sort=False):
+        row_numbers = rows.index.to_numpy() + 1
+        rejected[reason] = IllegalRows(len(row_numbers), row_ranges(row_numbers))
+    return (
+        "Unable to parse the comments of some of the CEX actions. "
+        "The rows were:\n\n" + format_illegal(rejected, "Reason")
+    )
+
+
 def reorder_columns(data: pd.DataFrame):
     """Reorders the columns of the given dataframe by the expected order"""
     return data.reindex(all_columns, axis=1)
 
 
-def run(file) -> str:
-    data = read_data(file)
+def output_fname(file: pathlib.Path, output_format: str = "csv") -> pathlib.Path:
+    """Returns the name of the converted file."""
+    return file.with_name(file.stem + "_converted" + OUTPUT_FORMATS[output_format])
+
+
+def run(
+    file,
+    chunksize: int = None,
+    output_format: str = "csv",
+    dataset=None,
+    incremental=None,
+    progress=None,
+    cancelled=None,
+    max_workers: int = None,
+) -> str:
+    """Converts the given file and saves it next to the original.
+    If chunksize is given and the file's format allows it, the file is
+    converted in chunks of that many rows.
+
+    The output is a CSV file unless output_format is "parquet" or
+    "arrow". If a dataset directory is given, the converted rows are
+    added to that dataset, partitioned by account and year, instead.
+
+    If an incremental directory is given, only the rows which weren't
+    converted into it before are converted, and added to its converted
+    files (see convert_incremental()).
+
+    If a progress callback is given, it's called with the Progress (the
+    stage and the rows it returned so far) each time a stage ends. Setting
+    the cancelled event (a threading.Event) stops the conversion before
+    its next stage or chunk, removing the partly converted file.
+
+    Formats whose rates are fetched from an API fetch them with at most
+    max_workers concurrent requests.
+
+    Returns a summary of the conversion for the user.
+    """
+    return convert(
+        file,
+        chunksize,
+        output_format,
+        dataset,
+        incremental=incremental,
+        progress=progress,
+        cancelled=cancelled,
+        max_workers=max_workers,
+    ).summary
+
+
+def convert(
+    file,
+    chunksize: int = None,
+    output_format: str = "csv",
+    dataset=None,
+    log=None,
+    profile=None,
+    incremental=None,
+    progress=None,
+    cancelled=None,
+    max_workers: int = None,
+) -> ConversionResult:
+    """Converts the given file like run(), returning the number of
+    converted and illegal rows as well as the summary, and the time, rows
+    and memory of each stage of the conversion.
+
+    If a log file is given, the result and the stages are appended to it
+    as a line of JSON. If a profile file is given, the conversion is
+    profiled with cProfile and the statistics are dumped to it.
+    """
+    recorder = StageRecorder(progress, cancelled)
+    with profiled(profile):
+        try:
+            result = _convert(
+                file,
+                chunksize,
+                output_format,
+                dataset,
+                incremental,
+                recorder,
+                max_workers,
+            )
+        except ConversionCancelled:
+            result = _failure(CANCELLED_MESSAGE)
+        except ImportError as e:
+            # The columnar formats' writers import pyarrow, an optional dependency
+            if (e.name or "").split(".")[0] != "pyarrow":
+                raise
+            result = _failure(PYARROW_MISSING_MESSAGE)
+    result = result._replace(stages=recorder.stages)
+    if log is not None:
+        write_log(log, file, result)
+    return result
+
+
+def _convert(
+    file,
+    chunksize,
+    output_format,
+    dataset,
+    incremental,
+    recorder: StageRecorder,
+    max_workers: int = None,
+) -> ConversionResult:
+    with recorder.stage("sniff_format"):
+        table_format = sniff_format(file)
+    if table_format is None:
+        return _failure(UNKNOWN_FORMAT_MESSAGE)
+    converter = load_converter(table_format.converter)
+    if max_workers is not None and table_format.converter in rate_converters:
+        # Keeping the converter's name, which its stage is measured under
+        converter = functools.update_wrapper(
+            functools.partial(converter, max_workers=max_workers), converter
+        )
+    if incremental is not None:
+        return convert_incremental(
+            file, converter, table_format, output_format, incremental, recorder
+        )
+    if chunksize is not None and table_format.converter in streamable_converters:
+        return convert_streaming(
+            file, converter, chunksize, table_format, output_format, dataset, recorder
+        )
+    with recorder.stage("read_data") as measured:
+        data = read_data(file, table_format)
+        measured.rows_out = len(data)
     try:
-        returned = identify_table_origin(data.columns)(data)
+        # Measured under the converter's name, to compare the converters
+        with recorder.stage(converter.__name__, len(data)) as measured:
+            returned = converter(data)
+            measured.rows_out = len(returned)
     except (NotImplementedError, KeyError, AssertionError):
-        return "Unknown table format. Please contact the application's author."
+        return _failure(UNKNOWN_FORMAT_MESSAGE)
+    except RateNotCached as e:
+        return _failure(f"Unable to convert the file in offline mode. {e}")
+    except TooManyCandidates as e:
+        return _failure(f"Unable to match the CEX actions to their orders. {e}")
+    except UnparsedActions as e:
+        return _failure(format_unparsed(e.unparsed))
+    # The read table's columns aren't needed once they were converted
+    del data
     try:
         assert all(col in returned.columns for col in mandatory_columns)
     except AssertionError:
-        return "Internal Error. Please contact the application's author."
-    returned = reorder_columns(returned)
-    filtered = filter_unneeded_rows(returned)
-    filtered = replace_invalid_currencies(filtered)
-    new_fname = file.stem + '_converted' + '.csv'
-    new_fname = file.with_name(new_fname)
+        return _failure(INTERNAL_ERROR_MESSAGE)
+    filtered = _clean(returned, recorder)
     try:
-        filtered.data.to_csv(new_fname, index=False, float_format="%f")
+        with recorder.stage("write", len(filtered.data)):
+            with open_writer(file, output_format, dataset) as writer:
+                writer.write(filtered.data)
     except PermissionError:
-        return "Unable to save file in folder. Please make sure it exists and that you have sufficient permissions to write to that directory, and try again."
+        return _failure(PERMISSION_ERROR_MESSAGE)
+    except (ValueError, TypeError):
+        return _failure(INTERNAL_ERROR_MESSAGE)
     formatted = format_result(filtered, len(returned))
-    return formatted
+    return ConversionResult(
+        formatted, True, len(returned), len(filtered.data), filtered.illegal
+    )
+
+
+def convert_streaming(
+    file,
+    converter,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    table_format=None,
+    output_format: str = "csv",
+    dataset=None,
+    recorder: StageRecorder = None,
+) -> ConversionResult:
+    """Converts the file chunk by chunk, appending each converted chunk
+    to the output, so that only one chunk is held in memory.
+    """
+    recorder = recorder or StageRecorder()
+    original_size = 0
+    converted_size = 0
+    illegal = {}
+    try:
+        writer = open_writer(file, output_format, dataset)
+    except PermissionError:
+        return _failure(PERMISSION_ERROR_MESSAGE)
+    failure = None
+    try:
+        with writer:
+            chunks = read_chunks(file, chunksize, table_format)
+            for chunk in recorder.iterate("read_chunks", chunks):
+                try:
+                    with recorder.stage(converter.__name__, len(chunk)) as measured:
+                        returned = converter(chunk)
+                        measured.rows_out = len(returned)
+                except (NotImplementedError, KeyError, AssertionError):
+                    failure = _failure(UNKNOWN_FORMAT_MESSAGE)
+                    break
+                if not all(col in returned.columns for col in mandatory_columns):
+                    failure = _failure(INTERNAL_ERROR_MESSAGE)
+                    break
+                filtered = _clean(returned, recorder)
+                try:
+                    with recorder.stage("write", len(filtered.data)):
+                        writer.write(filtered.data)
+                except PermissionError:
+                    failure = _failure(PERMISSION_ERROR_MESSAGE)
+                    break
+                except (ValueError, TypeError):
+                    failure = _failure(INTERNAL_ERROR_MESSAGE)
+                    break
+                original_size += len(returned)
+                converted_size += len(filtered.data)
+                illegal = merge_illegal(illegal, filtered.illegal)
+    except Exception:
+        # Cancelled or failed: the chunks written so far aren't a conversion
+        _remove_partial_output(file, output_format, dataset)
+        raise
+    if failure is not None:
+        _remove_partial_output(file, output_format, dataset)
+        return failure
+    formatted = format_summary(converted_size, illegal, original_size)
+    return ConversionResult(formatted, True, original_size, converted_size, illegal)
+
+
+def convert_incremental(
+    file,
+    converter,
+    table_format: TableFormat,
+    output_format: str = "csv",
+    directory=None,
+    recorder: StageRecorder = None,
+) -> ConversionResult:
+    """Converts only the rows of the file which weren't converted into
+    the directory before, and adds them to the directory's converted
+    files: a CSV file per account, or a dataset partitioned by account
+    and year in the columnar formats.
+
+    Converters which convert each row on its own only get the new rows.
+    The others, which match rows to each other, convert the whole file,
+    and only the converted rows beyond those in the manifest are added.
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    recorder = recorder or StageRecorder()
+    manifest = Manifest(directory)
+    row_wise = converter.__name__ in streamable_converters
+    with recorder.stage("read_data") as measured:
+        data = read_data(file, table_format)
+        measured.rows_out = len(data)
+    original_size = len(data)
+    skipped_size = 0
+    if row_wise:
+        with recorder.stage("skip_converted_sources", len(data)) as measured:
+            sources = fingerprints(data)
+            new_sources = manifest.new_sources(converter.__name__, sources)
+            data, sources = data.loc[new_sources], sources[new_sources]
+            measured.rows_out = len(data)
+        skipped_size = original_size - len(data)
+        if len(data) == 0:
+            formatted = format_incremental_summary(0, {}, skipped_size)
+            return ConversionResult(formatted, True, original_size, 0, {})
+    try:
+        with recorder.stage(converter.__name__, len(data)) as measured:
+            returned = converter(data)
+            measured.rows_out = len(returned)
+    except (NotImplementedError, KeyError, AssertionError):
+        return _failure(UNKNOWN_FORMAT_MESSAGE)
+    except RateNotCached as e:
+        return _failure(f"Unable to convert the file in offline mode. {e}")
+    except TooManyCandidates as e:
+        return _failure(f"Unable to match the CEX actions to their orders. {e}")
+    except UnparsedActions as e:
+        return _failure(format_unparsed(e.unparsed))
+    try:
+        assert all(col in returned.columns for col in mandatory_columns)
+    except AssertionError:
+        return _failure(INTERNAL_ERROR_MESSAGE)
+    filtered = _clean(returned, recorder)
+    converted = filtered.data
+    with recorder.stage("skip_converted_rows", len(converted)) as measured:
+        hashes = row_hashes(converted)
+        accounts = converted["Account"].astype(object).map(account_name).to_numpy()
+        positions_of_accounts = pd.Series(accounts).groupby(accounts).indices
+        is_new = np.ones(len(converted), dtype=bool)
+        if not row_wise:
+            for account, positions in positions_of_accounts.items():
+                is_new[positions] = manifest.new_rows(account, hashes[positions])
+        measured.rows_out = int(is_new.sum())
+    try:
+        with recorder.stage("write", int(is_new.sum())):
+            _write_incremental(
+                file, converted, is_new, positions_of_accounts, output_format, directory
+            )
+    except PermissionError:
+        return _failure(PERMISSION_ERROR_MESSAGE)
+    except (ValueError, TypeError):
+        return _failure(INTERNAL_ERROR_MESSAGE)
+    for account, positions in positions_of_accounts.items():
+        manifest.add_rows(account, hashes[positions[is_new[positions]]])
+    if row_wise:
+        manifest.add_sources(converter.__name__, sources)
+    manifest.save()
+    converted_size = int(is_new.sum())
+    known_size = skipped_size + len(converted) - converted_size
+    formatted = format_incremental_summary(converted_size, filtered.illegal, known_size)
+    return ConversionResult(
+        formatted, True, original_size, converted_size, filtered.illegal
+    )
+
+
+def _write_incremental(
+    file, converted, is_new, positions_of_accounts, output_format, directory
+):
+    if output_format != "csv":
+        with TableWriter(directory, output_format, True, file.stem) as writer:
+            if is_new.any():
+                writer.write(converted.iloc[np.flatnonzero(is_new)])
+        return
+    for account, positions in positions_of_accounts.items():
+        positions = positions[is_new[positions]]
+        if len(positions) == 0:
+            continue
+        fname = directory / f"{account}_converted.csv"
+        with TableWriter(fname, append=True) as writer:
+            writer.write(converted.iloc[positions])
+
+
+def _remove_partial_output(file, output_format: str, dataset=None):
+    # The chunks written to a dataset are files of their own, and stay
+    if dataset is None:
+        output_fname(file, output_format).unlink(missing_ok=True)
+
+
+def open_writer(file, output_format: str = "csv", dataset=None) -> TableWriter:
+    """Opens the writer of the converted file, or of the dataset the
+    converted rows are added to.
+    """
+    if dataset is not None:
+        return TableWriter(dataset, output_format, partitioned=True, name=file.stem)
+    return TableWriter(output_fname(file, output_format), output_format)
+
+
+def _clean(returned: pd.DataFrame, recorder: StageRecorder) -> FilteredData:
+    """Turns the converted table's text columns into categoricals, orders
+    its columns, drops the rows which aren't trades and replaces invalid
+    currencies, measuring each step.
+    """
+    # Categorized first, so that reordering copies the codes rather than
+    # the strings
+    with recorder.stage("categorize", len(returned)):
+        returned = categorize(returned)
+    with recorder.stage("reorder_columns", len(returned)):
+        returned = reorder_columns(returned)
+    with recorder.stage("filter_unneeded_rows", len(returned)) as measured:
+        filtered = filter_unneeded_rows(returned)
+        measured.rows_out = len(filtered.data)
+    with recorder.stage("replace_invalid_currencies", len(filtered.data)):
+        filtered = replace_invalid_currencies(filtered)
+    return filtered
+
+
+def _failure(summary: str) -> ConversionResult:
+    return ConversionResult(summary, False, 0, 0, {})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+This module stores coin conversion rates on disk so that they're fetched
+from the exchange's API only once.
+
+Rates are kept in an SQLite database, keyed by the coin, the currency it's
+quoted in and the (UTC) day of the rate, with an in-memory LRU cache in
+front of it. In offline mode a rate which isn't in the cache raises an
+error instead of being fetched.
+"""
+import os
+import pathlib
+import sqlite3
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".convert_bitcoin_formats" / "rates.sqlite"
+OFFLINE_ENV_VAR = "CONVERT_FORMAT_OFFLINE"
+
+
+class RateNotCached(LookupError):
+    """Raised in offline mode when the requested rate isn't cached."""
+
+
+class RateCache:
+    """A persistent cache of coin conversion rates.
+
+    ``hits`` and ``misses`` count the lookups which were answered by the
+    cache and the ones that weren't.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        memory_size: int = 4096,
+        offline: bool = False,
+    ):
+        self.path = pathlib.Path(path)
+        self.memory_size = memory_size
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        if str(path) != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rates "
+            "(coin TEXT, quote TEXT, day TEXT, rate REAL, "
+            "PRIMARY KEY (coin, quote, day))"
+        )
+        self._db.commit()
+
+    def get(self, coin: str, quote: str, day: str) -> Optional[float]:
+        """Returns the cached rate, or None if it wasn't cached."""
+        key = (coin, quote, day)
+        try:
+            rate = self._memory[key]
+        except KeyError:
+            row = self._db.execute(
+                "SELECT rate FROM rates WHERE coin = ? AND quote = ? AND day = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            rate = row[0]
+            self._remember(key, rate)
+        else:
+            self._memory.move_to_end(key)
+        self.hits += 1
+        return rate
+
+    def put(self, coin: str, quote: str, day: str, rate: float):
+        """Stores the rate in memory and on disk."""
+        key = (coin, quote, day)
+        self._db.execute("INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?)", (*key, rate))
+        self._db.commit()
+        self._remember(key, rate)
+
+    def lookup(
+        self, coin: str, quote: str, day: str, fetch: Callable[[], float]
+    ) -> float:
+        """Returns the cached rate, calling ``fetch`` to get and store it
+        if it isn't cached yet.
+        """
+        rate = self.get(coin, quote, day)
+        if rate is not None:
+            return rate
+        if self.offline:
+            raise RateNotCached(
+                f"The {coin}/{quote} rate of {day} isn't cached and offline mode is on."
+            )
+        rate = fetch()
+        self.put(coin, quote, day, rate)
+        return rate
+
+    def close(self):
+        self._db.close()
+
+    def _remember(self, key, rate):
+        self._memory[key] = rate
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+
+_default_cache = None
+
+
+def default_cache() -> RateCache:
+    """Returns the cache shared by all conversions of this process.
+    Offline mode is turned on by setting the CONVERT_FORMAT_OFFLINE
+    environment variable.
+    """
+    global _default_cache
+    if _default_cache is None:
+        offline = os.environ.get(OFFLINE_ENV_VAR, "") not in ("", "0")
+        _default_cache = RateCache(offline=offline)
+    return _default_cache
@@ -0,0 +1,220 @@
+"""
+This module keeps a local history of coin prices, so that the prices of a
+table's trades are looked up on disk rather than fetched from an API one
+day at a time.
+
+The prices of each coin, in the currency they're quoted in, are kept as
+two arrays sorted by time: the timestamps (UTC nanoseconds) and the prices
+at them, each in a .npy file which is memory-mapped when it's looked up.
+A whole column of dates is looked up at once with a binary search, which
+finds the last price at or before each date.
+
+The history is imported from CSV dumps, of prices or of OHLC candles:
+
+    python price_store.py import btc_usd_1m.csv --coin BTC
+"""
+import argparse
+import os
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_STORE_PATH = pathlib.Path.home() / ".convert_bitcoin_formats" / "prices"
+STORE_ENV_VAR = "CONVERT_FORMAT_PRICE_STORE"
+QUOTE = "USD"
+NS_PER_DAY = 86400 * 10 ** 9
+# A price older than this isn't the price of a date anymore
+MAX_AGE = NS_PER_DAY
+
+TIME_COLUMNS = ("timestamp", "time", "date", "datetime", "unix", "open_time", "mts")
+# Of a candle, the opening price is the one known at its timestamp
+PRICE_COLUMNS = ("price", "open", "rate", "close")
+COIN_COLUMNS = ("symbol", "coin", "asset")
+# Numeric timestamps above this are in milliseconds rather than seconds
+MILLISECONDS_THRESHOLD = 10 ** 11
+
+
+class PriceStore:
+    """The price histories kept in a directory, one per coin and quote."""
+
+    def __init__(self, directory=DEFAULT_STORE_PATH):
+        self.directory = pathlib.Path(directory)
+        self._loaded = {}
+
+    def pairs(self) -> list:
+        """Returns the (coin, quote) pairs which have a history."""
+        if not self.directory.exists():
+            return []
+        files = self.directory.glob("*.timestamps.npy")
+        names = (path.name[: -len(".timestamps.npy")] for path in files)
+        return sorted(tuple(name.split("-", 1)) for name in names)
+
+    def history(self, coin: str, quote: str = QUOTE):
+        """Returns the memory-mapped timestamps and prices of the coin,
+        or None if it has no history.
+        """
+        key = (coin.upper(), quote.upper())
+        if key not in self._loaded:
+            timestamps, prices = self._paths(*key)
+            try:
+                self._loaded[key] = (
+                    np.load(timestamps, mmap_mode="r"),
+                    np.load(prices, mmap_mode="r"),
+                )
+            except FileNotFoundError:
+                return None
+        return self._loaded[key]
+
+    def add(self, coin: str, timestamps, prices, quote: str = QUOTE):
+        """Adds prices to the coin's history. A price at a time which
+        already has one replaces it.
+        """
+        coin, quote = coin.upper(), quote.upper()
+        timestamps = _to_timestamps(timestamps)
+        prices = np.asarray(prices, dtype=np.float64)
+        known = ~(np.isnan(prices) | (timestamps == np.iinfo(np.int64).min))
+        timestamps, prices = timestamps[known], prices[known]
+        stored = self.history(coin, quote)
+        if stored is not None:
+            timestamps = np.concatenate([stored[0], timestamps])
+            prices = np.concatenate([stored[1], prices])
+        # Sorting in reverse keeps the last of the prices at the same time
+        order = np.argsort(timestamps[::-1], kind="stable")
+        timestamps, prices = timestamps[::-1][order], prices[::-1][order]
+        first = np.r_[True, timestamps[1:] != timestamps[:-1]]
+        self._write(coin, quote, timestamps[first], prices[first])
+
+    def lookup(
+        self, coins, dates, quote: str = QUOTE, max_age: int = MAX_AGE
+    ) -> np.ndarray:
+        """Returns the last price of each coin at or before its matching
+        date, in the quote currency. Prices which aren't stored, or are
+        older than max_age nanoseconds, are NaN.
+        """
+        timestamps = _to_timestamps(dates)
+        coin_codes, coin_names = pd.factorize(np.asarray(coins, dtype=object))
+        rates = np.full(len(timestamps), np.nan)
+        order = np.argsort(coin_codes, kind="stable")
+        bounds = np.searchsorted(coin_codes[order], np.arange(len(coin_names) + 1))
+        for code, coin in enumerate(coin_names):
+            history = self.history(str(coin), quote)
+            if history is None or len(history[0]) == 0:
+                continue
+            stored_timestamps, stored_prices = history
+            positions = order[bounds[code] : bounds[code + 1]]
+            wanted = timestamps[positions]
+            at = np.searchsorted(stored_timestamps, wanted, side="right") - 1
+            before = np.maximum(at, 0)
+            found = (at >= 0) & (wanted - stored_timestamps[before] <= max_age)
+            rates[positions[found]] = stored_prices[at[found]]
+        return rates
+
+    def _write(self, coin: str, quote: str, timestamps: np.ndarray, prices: np.ndarray):
+        # Dropping the maps before the files they map are replaced
+        self._loaded.pop((coin, quote), None)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path, array in zip(self._paths(coin, quote), (timestamps, prices)):
+            temporary = path.with_name(path.name + ".tmp")
+            with open(temporary, "wb") as f:
+                np.save(f, array)
+            os.replace(temporary, path)
+
+    def _paths(self, coin: str, quote: str):
+        name = f"{coin}-{quote}"
+        return (
+            self.directory / f"{name}.timestamps.npy",
+            self.directory / f"{name}.prices.npy",
+        )
+
+
+def import_prices(
+    store: PriceStore, fname: pathlib.Path, coin: str = None, quote: str = QUOTE
+) -> int:
+    """Adds the prices of a CSV dump to the store: a time column and a
+    price column (or the candles' opening prices), and a coin column
+    unless the coin is given.
+
+    Returns the number of imported prices.
+    """
+    data = pd.read_csv(fname)
+    columns = {column.strip().lower(): column for column in data.columns}
+    time_column = _find_column(columns, TIME_COLUMNS, fname)
+    price_column = _find_column(columns, PRICE_COLUMNS, fname)
+    timestamps = _parse_times(data[time_column])
+    prices = pd.to_numeric(data[price_column], errors="coerce").to_numpy(np.float64)
+    if coin is not None:
+        store.add(coin, timestamps, prices, quote)
+        return len(data)
+    coin_column = _find_column(columns, COIN_COLUMNS, fname)
+    coins = data[coin_column].astype(str).str.upper().to_numpy()
+    for name in pd.unique(coins):
+        rows = coins == name
+        store.add(name, timestamps[rows], prices[rows], quote)
+    return len(data)
+
+
+def _find_column(columns: dict, candidates, fname) -> str:
+    for candidate in candidates:
+        if candidate in columns:
+            return columns[candidate]
+    raise ValueError(f"{fname} has none of the columns {', '.join(candidates)}.")
+
+
+def _parse_times(column: pd.Series) -> np.ndarray:
+    """Parses dates, or Unix times in seconds or in milliseconds."""
+    if pd.api.types.is_numeric_dtype(column):
+        numbers = column.to_numpy(np.float64)
+        unit = "ms" if np.nanmax(np.abs(numbers), initial=0) > MILLISECONDS_THRESHOLD else "s"
+        return _to_timestamps(pd.to_datetime(numbers, unit=unit, utc=True))
+    return _to_timestamps(pd.to_datetime(column, utc=True))
+
+
+def _to_timestamps(dates) -> np.ndarray:
+    """Returns the dates as UTC nanoseconds, NaT being the lowest int64."""
+    if isinstance(dates, np.ndarray) and dates.dtype == np.int64:
+        return dates
+    dates = pd.to_datetime(pd.Series(dates), utc=True)
+    return pd.DatetimeIndex(dates).asi8
+
+
+_default_store = None
+
+
+def default_store() -> PriceStore:
+    """Returns the store shared by all conversions of this process, kept
+    in the directory given by the CONVERT_FORMAT_PRICE_STORE environment
+    variable, if set.
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = PriceStore(os.environ.get(STORE_ENV_VAR) or DEFAULT_STORE_PATH)
+    return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", type=pathlib.Path, default=None, help="Store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importing = commands.add_parser("import", help="Import CSV dumps of prices")
+    importing.add_argument("files", nargs="+", type=pathlib.Path)
+    importing.add_argument("--coin", default=None, help="The coin of all of the rows")
+    importing.add_argument("--quote", default=QUOTE, help="The currency of the prices")
+    commands.add_parser("list", help="List the stored histories")
+    args = parser.parse_args(argv)
+    store = PriceStore(args.store) if args.store else default_store()
+    if args.command == "import":
+        for fname in args.files:
+            rows = import_prices(store, fname, args.coin, args.quote)
+            print(f"Imported {rows} prices from {fname}.")
+    else:
+        for coin, quote in store.pairs():
+            timestamps, _ = store.history(coin, quote)
+            first, last = pd.to_datetime([timestamps[0], timestamps[-1]], utc=True)
+            print(f"{coin}/{quote}: {len(timestamps)} prices, {first} to {last}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+This module measures the stages of a conversion: the wall time each of
+them took, the rows it got and returned and how much the process's memory
+grew or shrank meanwhile.
+
+Chunked conversions go through the same stages once per chunk, so the
+measurements of a stage are added up. The progress of a conversion can be
+followed as each stage ends, and a conversion can be cancelled before any
+stage starts. A conversion's measurements can be
+appended to a JSON log, and the whole conversion can be profiled with
+cProfile.
+"""
+import contextlib
+import json
+import os
+import pathlib
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+
+StageTiming = namedtuple("StageTiming", "stage, seconds, rows_in, rows_out, memory_delta")
+# The stage which ended, and the rows it returned so far in the conversion
+Progress = namedtuple("Progress", "stage, rows")
+
+STATM = pathlib.Path("/proc/self/statm")
+MB = 1 << 20
+
+
+def current_rss():
+    """Returns the resident memory of the process in bytes, or None if
+    it can't be told on this platform.
+    """
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss
+    try:
+        pages = int(STATM.read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class ConversionCancelled(Exception):
+    """Raised when a stage is about to start in a cancelled conversion."""
+
+
+class StageRecorder:
+    """Records the stages of a conversion, in the order they first ran.
+
+    ``progress`` is called with the Progress of each stage which ended.
+    Setting the ``cancelled`` event (a threading.Event) makes the next
+    stage raise ConversionCancelled instead of starting.
+    """
+
+    def __init__(self, progress=None, cancelled=None):
+        self.progress = progress
+        self.cancelled = cancelled
+        self._stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int = 0):
+        """Measures the stage run in the block. The rows it returned are
+        the rows it got unless ``rows_out`` is set on the yielded object.
+        """
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise ConversionCancelled(f"Cancelled before {name}.")
+        measured = SimpleNamespace(rows_out=rows_in)
+        memory_before = current_rss()
+        start = time.perf_counter()
+        ended = False
+        try:
+            yield measured
+            ended = True
+        finally:
+            seconds = time.perf_counter() - start
+            memory_after = current_rss()
+            memory_delta = None
+            if memory_before is not None and memory_after is not None:
+                memory_delta = memory_after - memory_before
+            timing = StageTiming(name, seconds, rows_in, measured.rows_out, memory_delta)
+            self._add(timing)
+        if ended and self.progress is not None:
+            self.progress(Progress(name, self._stages[name].rows_out))
+
+    def iterate(self, name: str, chunks):
+        """Yields the chunks, measuring the reading of each of them as
+        the given stage.
+        """
+        chunks = iter(chunks)
+        while True:
+            with self.stage(name) as measured:
+                chunk = next(chunks, None)
+                measured.rows_out = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+    @property
+    def stages(self) -> tuple:
+        return tuple(self._stages.values())
+
+    def _add(self, timing: StageTiming):
+        previous = self._stages.get(timing.stage)
+        if previous is not None:
+            memory_delta = None
+            if previous.memory_delta is not None and timing.memory_delta is not None:
+                memory_delta = previous.memory_delta + timing.memory_delta
+            timing = StageTiming(
+                timing.stage,
+                previous.seconds + timing.seconds,
+                previous.rows_in + timing.rows_in,
+                previous.rows_out + timing.rows_out,
+                memory_delta,
+            )
+        self._stages[timing.stage] = timing
+
+
+def format_timings(stages) -> str:
+    """Formats the stages' measurements as a table for the user."""
+    lines = ["Stage                          Time      Rows in   Rows out    Memory"]
+    for timing in stages:
+        memory = ""
+        if timing.memory_delta is not None:
+            memory = f"{timing.memory_delta / MB:+.1f} MiB"
+        lines.append(
+            f"{timing.stage:<27}{timing.seconds:>8.3f}s"
+            f"{timing.rows_in:>11}{timing.rows_out:>11}{memory:>12}"
+        )
+    total = sum(timing.seconds for timing in stages)
+    lines.append(f"{'Total':<27}{total:>8.3f}s")
+    return "\n".join(lines)
+
+
+def write_log(log: pathlib.Path, file: pathlib.Path, result):
+    """Appends the conversion's result and stages to the log, as a line
+    of JSON.
+    """
+    entry = {
+        "file": str(file),
+        "success": result.success,
+        "original_size": int(result.original_size),
+        "converted_size": int(result.converted_size),
+        "stages": [timings_to_dict(timing) for timing in result.stages],
+    }
+    with open(log, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def timings_to_dict(timing: StageTiming) -> dict:
+    return {
+        "stage": timing.stage,
+        "seconds": round(timing.seconds, 6),
+        "rows_in": int(timing.rows_in),
+        "rows_out": int(timing.rows_out),
+        "memory_delta": timing.memory_delta,
+    }
+
+
+@contextlib.contextmanager
+def profiled(fname: pathlib.Path = None):
+    """Profiles the block with cProfile and dumps the statistics to the
+    file, which pstats and snakeviz read. Does nothing if no file is given.
+    """
+    if fname is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(fname)
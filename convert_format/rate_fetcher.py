@@ -0,0 +1,133 @@
+"""
+This module fetches coin conversion rates from Bitfinex's API.
+
+A whole table's worth of rates is resolved at once: the unique
+(coin, day) pairs are collected first, the ones which aren't cached are
+fetched concurrently over a pooled HTTP session and the rates are then
+mapped back to the rows of the table.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from price_cache import RateCache, RateNotCached, default_cache
+
+
+BITFINEX_URL = "https://api-pub.bitfinex.com/v2/trades/t{}USD/hist"
+QUOTE = "USD"
+MAX_WORKERS = 8
+RETRIES = 4
+BACKOFF = 0.5
+TIMEOUT = 30
+NS_PER_DAY = 86400 * 10 ** 9
+
+
+def make_session(max_workers: int = MAX_WORKERS) -> requests.Session:
+    """Returns a session whose connection pool can serve all workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_rate(
+    coin: str,
+    start: int,
+    session: requests.Session = None,
+    retries: int = RETRIES,
+    backoff: float = BACKOFF,
+) -> float:
+    """Queries Bitfinex's API for the price of the first trade of the given
+    coin in the day starting at the given timestamp (in milliseconds).
+
+    Rate-limited (429) and server-side errors are retried with an
+    exponential backoff, or after the delay given by the server.
+    """
+    session = session or requests
+    params = {"limit": 1, "start": start, "end": start + 86400000, "sort": 1}
+    for attempt in range(retries + 1):
+        r = session.get(BITFINEX_URL.format(coin), params=params, timeout=TIMEOUT)
+        retryable = r.status_code == 429 or r.status_code >= 500
+        if not retryable or attempt == retries:
+            break
+        try:
+            delay = float(r.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = backoff * 2 ** attempt
+        time.sleep(delay)
+    r.raise_for_status()
+    return r.json()[0][3]
+
+
+def resolve_rates(
+    coins: pd.Series,
+    dates: pd.Series,
+    cache: RateCache = None,
+    max_workers: int = None,
+) -> np.ndarray:
+    """Returns the USD rate of each coin in the day of its matching date,
+    or NaN where the coin or the date is missing.
+
+    Each unique (coin, day) pair is looked up in the cache once, and the
+    missing ones are fetched concurrently by at most ``max_workers``
+    threads (MAX_WORKERS by default).
+    """
+    cache = cache or default_cache()
+    max_workers = max_workers or MAX_WORKERS
+    coin_codes, coin_names = pd.factorize(pd.Series(coins, dtype=object).str.upper())
+    timestamps = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates), utc=True)).asi8
+    known = (coin_codes >= 0) & (timestamps != np.iinfo(np.int64).min)
+    result = np.full(len(known), np.nan)
+    if not known.any():
+        return result
+    days = timestamps[known] // NS_PER_DAY
+    # Counting the days from the first one keeps them in the pair's low bits
+    first_day = days.min()
+    pairs = coin_codes[known].astype(np.int64) * (1 << 32) + (days - first_day)
+    codes, unique_pairs = pd.factorize(pairs)
+    unique_keys = [
+        (
+            coin_names[pair >> 32],
+            pd.Timestamp(((pair & 0xFFFFFFFF) + first_day) * NS_PER_DAY, tz="UTC"),
+        )
+        for pair in unique_pairs.tolist()
+    ]
+    rates = np.empty(len(unique_keys), dtype=np.float64)
+    missing = []
+    for position, (coin, day) in enumerate(unique_keys):
+        rate = cache.get(coin, QUOTE, day.strftime("%Y-%m-%d"))
+        if rate is None:
+            missing.append(position)
+        else:
+            rates[position] = rate
+    if missing and cache.offline:
+        coin, day = unique_keys[missing[0]]
+        raise RateNotCached(
+            f"{len(missing)} rates, such as the {coin}/{QUOTE} rate of "
+            f"{day:%Y-%m-%d}, aren't cached and offline mode is on."
+        )
+    if missing:
+        session = make_session(max_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                fetched = executor.map(
+                    lambda position: fetch_rate(
+                        unique_keys[position][0],
+                        int(unique_keys[position][1].timestamp() * 1000.0),
+                        session,
+                    ),
+                    missing,
+                )
+                for position, rate in zip(missing, fetched):
+                    coin, day = unique_keys[position]
+                    cache.put(coin, QUOTE, day.strftime("%Y-%m-%d"), rate)
+                    rates[position] = rate
+        finally:
+            session.close()
+    result[known] = rates[codes]
+    return result
@@ -0,0 +1,202 @@
+"""
+This module caches the tables read from Excel files, so that a workbook
+which didn't change is parsed only once.
+
+A table is stored as a Parquet file keyed by the hash of the workbook's
+content and of the schema it was read with. A JSON manifest next to the
+tables records their sources, sizes and last use. When the cache outgrows
+its limits the least recently used tables are evicted.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import pathlib
+import time
+from typing import Optional
+
+import pandas as pd
+
+
+DEFAULT_CACHE_DIR = pathlib.Path.home() / ".convert_bitcoin_formats" / "sheets"
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+MANIFEST_NAME = "manifest.json"
+TABLE_SUFFIX = ".parquet"
+MAX_BYTES_ENV_VAR = "CONVERT_FORMAT_SHEET_CACHE_MB"
+HASH_BLOCK_SIZE = 2 ** 20
+# Bumped whenever the way sheets are read changes, invalidating old tables
+CACHE_VERSION = 1
+
+
+class SheetCache:
+    """A size-limited cache of parsed Excel tables.
+
+    ``max_bytes`` and ``max_entries`` limit the total size and number of
+    the cached tables. ``hits`` and ``misses`` count the lookups which were
+    answered by the cache and the ones that weren't.
+    """
+
+    def __init__(
+        self,
+        directory=DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entries: int = None,
+    ):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Parquet needs pyarrow, without which nothing is cached."""
+        return self.max_bytes > 0 and importlib.util.find_spec("pyarrow") is not None
+
+    def key(self, fname: pathlib.Path, schema=None) -> str:
+        """Returns the key of the table read from the file with the given
+        schema, which changes whenever the file's content does.
+        """
+        digest = hashlib.sha256(repr((CACHE_VERSION, schema)).encode())
+        with open(fname, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Returns the cached table, or None if it wasn't cached."""
+        if not self.enabled:
+            return None
+        manifest = self._read_manifest()
+        entry = manifest.get(key)
+        try:
+            if entry is None:
+                raise FileNotFoundError(key)
+            data = pd.read_parquet(self._table_path(key))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        entry["last_used"] = time.time()
+        self._write_manifest(manifest)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: pd.DataFrame, source: pathlib.Path = None):
+        """Stores the table and evicts old ones if the cache is too big.
+        Tables which Parquet can't represent exactly, like columns of mixed
+        types, aren't cached.
+        """
+        if not self.enabled or not _round_trips(data):
+            return
+        path = self._table_path(key)
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            data.to_parquet(temporary)
+            os.replace(temporary, path)
+            size = path.stat().st_size
+        except (OSError, ValueError, TypeError, NotImplementedError):
+            # pyarrow's conversion errors derive from these. A cache which
+            # can't be written to is skipped rather than failing the read
+            _unlink(temporary)
+            return
+        manifest = self._read_manifest()
+        now = time.time()
+        manifest[key] = {
+            "source": str(pathlib.Path(source).resolve()) if source else None,
+            "size": size,
+            "rows": len(data),
+            "created": now,
+            "last_used": now,
+        }
+        self._evict(manifest)
+        self._write_manifest(manifest)
+
+    def evict(self):
+        """Removes the least recently used tables until the cache fits
+        its limits.
+        """
+        manifest = self._read_manifest()
+        self._evict(manifest)
+        self._write_manifest(manifest)
+
+    def clear(self):
+        """Removes all of the cached tables."""
+        manifest = self._read_manifest()
+        for key in list(manifest):
+            _unlink(self._table_path(key))
+        self._write_manifest({})
+
+    def size(self) -> int:
+        """Returns the total size of the cached tables in bytes."""
+        return sum(entry["size"] for entry in self._read_manifest().values())
+
+    def _evict(self, manifest: dict):
+        by_last_use = sorted(manifest, key=lambda key: manifest[key]["last_used"])
+        total = sum(entry["size"] for entry in manifest.values())
+        for key in by_last_use:
+            too_many = self.max_entries is not None and len(manifest) > self.max_entries
+            if total <= self.max_bytes and not too_many:
+                break
+            total -= manifest.pop(key)["size"]
+            _unlink(self._table_path(key))
+
+    def _table_path(self, key: str) -> pathlib.Path:
+        return self.directory / (key + TABLE_SUFFIX)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.directory / MANIFEST_NAME) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A missing or corrupt manifest only loses the cached tables
+            return {}
+
+    def _write_manifest(self, manifest: dict):
+        if not self.directory.exists():
+            return
+        path = self.directory / MANIFEST_NAME
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(temporary, "w") as f:
+                json.dump(manifest, f, indent=1)
+            # Replacing the file keeps concurrent readers from seeing half of it
+            os.replace(temporary, path)
+        except OSError:
+            _unlink(temporary)
+
+
+def _unlink(path: pathlib.Path):
+    try:
+        path.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _round_trips(data: pd.DataFrame) -> bool:
+    """Whether Parquet would give back the same dtypes. Object columns
+    come back typed unless they hold only strings.
+    """
+    return all(
+        pd.api.types.infer_dtype(data.iloc[:, position]) == "string"
+        for position in range(data.shape[1])
+        if data.dtypes.iloc[position] == object
+    )
+
+
+_default_cache = None
+
+
+def default_cache() -> SheetCache:
+    """Returns the cache shared by all conversions of this process.
+    Its size limit, in megabytes, is set by the CONVERT_FORMAT_SHEET_CACHE_MB
+    environment variable, and setting it to 0 turns the cache off.
+    """
+    global _default_cache
+    if _default_cache is None:
+        max_bytes = DEFAULT_MAX_BYTES
+        megabytes = os.environ.get(MAX_BYTES_ENV_VAR, "")
+        if megabytes:
+            max_bytes = int(float(megabytes) * 2 ** 20)
+        _default_cache = SheetCache(max_bytes=max_bytes)
+    return _default_cache
@@ -0,0 +1,111 @@
+"""
+This module keeps the text columns of the converted tables as
+categoricals, which store each distinct value once and a small integer
+code per row, instead of millions of repeated short strings.
+
+The symbol columns (the traded coin, the currency it's priced in and the
+fee's currency) share one dictionary of categories, so the same symbol
+has the same code in all of them. Normalizing the currencies' names is
+then a rename of the dictionary's categories, which costs as much as the
+number of distinct symbols rather than the number of rows.
+"""
+import numpy as np
+import pandas as pd
+
+
+SYMBOL_COLUMNS = ("Symbol", "Currency", "FeeCurrency")
+CURRENCY_ALIASES = {"NIS": "ILS", "XBT": "BTC", "XDG": "DOGE"}
+# Kraken's older assets are named with a leading X for coins and Z for fiat
+KRAKEN_ASSETS = frozenset(
+    {
+        "XETC", "XETH", "XICN", "XLTC", "XMLN", "XNMC", "XREP", "XXBT",
+        "XXDG", "XXLM", "XXMR", "XXRP", "XXTZ", "XXVN", "XZEC",
+        "ZAUD", "ZCAD", "ZCHF", "ZEUR", "ZGBP", "ZJPY", "ZKRW", "ZUSD",
+    }
+)
+
+
+def categorize(data: pd.DataFrame) -> pd.DataFrame:
+    """Turns the converted table's text columns into categoricals, the
+    symbol columns sharing their categories. Columns which hold anything
+    other than text are left as they are.
+    """
+    symbols = [
+        column for column in SYMBOL_COLUMNS if column in data and _is_text(data[column])
+    ]
+    factorized = [_factorize(data[column]) for column in symbols]
+    shared = pd.Index(
+        np.concatenate([np.asarray(uniques, dtype=object) for _, uniques in factorized] or [[]])
+    ).unique()
+    for column, (codes, uniques) in zip(symbols, factorized):
+        shared_codes = np.append(shared.get_indexer(uniques), -1)[codes]
+        data[column] = pd.Categorical.from_codes(shared_codes, shared)
+    for column in ("Action", "Account"):
+        if column not in data:
+            continue
+        if _is_text(data[column]) and not _is_categorical(data[column]):
+            data[column] = data[column].astype("category")
+    return data
+
+
+def normalize_symbol(symbol):
+    """Returns the usual name of a currency: ILS rather than NIS, and BTC
+    rather than XBT or Kraken's XXBT.
+    """
+    if not isinstance(symbol, str):
+        return symbol
+    if symbol in KRAKEN_ASSETS:
+        symbol = symbol[1:]
+    return CURRENCY_ALIASES.get(symbol, symbol)
+
+
+def normalize_currencies(data: pd.DataFrame) -> pd.DataFrame:
+    """Renames the currencies of the symbol columns to their usual names."""
+    renamed = {}
+    for column in SYMBOL_COLUMNS:
+        if _is_categorical(data[column]):
+            renamed[column] = rename_categories(data[column], normalize_symbol)
+        elif _is_text(data[column]):
+            renamed[column] = data[column].map(normalize_symbol, na_action="ignore")
+    if not renamed:
+        return data
+    return data.assign(**renamed)
+
+
+def rename_categories(column: pd.Series, rename) -> pd.Series:
+    """Renames each of the column's categories. Categories renamed to the
+    same name are merged, which is the only case the rows' codes change.
+    """
+    categories = column.cat.categories
+    names = pd.Index([rename(category) for category in categories], dtype=object)
+    if names.equals(categories.astype(object)):
+        return column
+    if names.is_unique:
+        return column.cat.rename_categories(names)
+    codes_of_names, merged = pd.factorize(names)
+    codes = np.append(codes_of_names, -1)[column.cat.codes.to_numpy()]
+    return pd.Series(
+        pd.Categorical.from_codes(codes, merged), index=column.index, name=column.name
+    )
+
+
+def is_text_categorical(column: pd.Series) -> bool:
+    return _is_categorical(column) and _is_text(column)
+
+
+def _factorize(column: pd.Series):
+    if _is_categorical(column):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    return pd.factorize(column)
+
+
+def _is_categorical(column: pd.Series) -> bool:
+    return isinstance(column.dtype, pd.CategoricalDtype)
+
+
+def _is_text(column: pd.Series) -> bool:
+    if _is_categorical(column):
+        return pd.api.types.infer_dtype(column.cat.categories) in ("string", "empty")
+    if column.dtype != object:
+        return False
+    return pd.api.types.infer_dtype(column, skipna=True) in ("string", "empty")
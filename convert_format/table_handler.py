@@ -4,252 +4,99 @@ to the correct format.
 """
 import re
 import datetime
-from itertools import combinations
 import json
+from collections import namedtuple
 
 import pandas as pd
 import numpy as np
-import requests
 
-
-mandatory_columns = ["Date", "Action", "Symbol", "Volume", "Currency"]
-all_columns = mandatory_columns + ["Account", "Total", "Price", "Fee", "FeeCurrency"]
-
-DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S %z"
-
-epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
-
-binance0 = (
-    "Date(UTC)",
-    "Market",
-    "Type",
-    "Price",
-    "Amount",
-    "Total",
-    "Fee",
-    "Fee Coin",
+from cex_matcher import (
+    TooManyCandidates,
+    UnparsedActions,
+    find_single_action,
+    find_action_group,
 )
-bit2c0 = (
-    "Date",
-    "Action",
-    "firstCoin",
-    "Currency",
-    "Volume",
-    "Price",
-    "Fee",
-    "FeeCurrency",
-    "Source",
+from formats import (
+    all_columns,
+    table_origin,
+    binance0,
+    bit2c0,
+    bit2c1,
+    bitfinex0,
+    bittrex0,
+    cex0,
+    exodus0,
+    idex0,
+    idex1,
+    ledgers0,
+    lqui0,
+    member0,
+    shapeshift0,
+    trade0,
+    trades0,
 )
+from markets import split_markets
 
-bit2c1 = (
-    "id",
-    "created",
-    "accountAction",
-    "firstCoin",
-    "secondCoin",
-    "firstAmount",
-    "secondAmount",
-    "price",
-    "feeAmount",
-    "fee",
-    "ref",
-)
 
-bit2c2 = (
-    "id",
-    "created",
-    "accountAction",
-    "firstCoin",
-    "secondCoin",
-    "firstAmount",
-    "secondAmount",
-    "price",
-    "feeAmount",
-    "fee",
-    "balance1",
-    "balance2",
-    "ref",
-)
+epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
 
-bitfinex0 = ("#", "PAIR", "AMOUNT", "PRICE", "FEE", "FEE CURRENCY", "DATE", "ORDER ID")
-bittrex0 = (
-    "Uuid",
-    "Exchange",
-    "TimeStamp",
-    "OrderType",
-    "Limit",
-    "Quantity",
-    "QuantityRemaining",
-    "Commission",
-    "Price",
-    "PricePerUnit",
-    "IsConditional",
-    "Condition",
-    "ConditionTarget",
-    "ImmediateOrCancel",
-    "Closed",
-)
-cex0 = (
-    "DateUTC",
-    "Amount",
-    "Symbol",
-    "Balance",
-    "Type",
-    "Pair",
-    "FeeSymbol",
-    "FeeAmount",
-    "Comment",
-)
-exodus0 = (
-    "DATE",
-    "TYPE",
-    "OUTAMOUNT",
-    "OUTCURRENCY",
-    "FEEAMOUNT",
-    "FEECURRENCY",
-    "OUTTXID",
-    "OUTTXURL",
-    "INAMOUNT",
-    "INCURRENCY",
-    "INTXID",
-    "INTXURL",
-    "ORDERID",
-)
-ledgers0 = (
-    "txid",
-    "refid",
-    "time",
-    "type",
-    "aclass",
-    "asset",
-    "amount",
-    "fee",
-    "balance",
-)
-lqui0 = (
-    "Date",
-    "Market",
-    "Type",
-    "Price",
-    "Amount",
-    "Total",
-    "Fee",
-    "OrderId",
-    "TradeId",
-    "Change Base",
-    " Change Quote",
-)
-member0 = (
-    "Symbol",
-    "Currency",
-    "Action",
-    "Volume",
-    "PRICE",
-    "FEE",
-    "FEECURRENCY",
-    "DATE",
-    "Source",
-)
-shapeshift0 = (
-    "כמות רכישה",
-    "מטבע רכישה",
-    "כמות מכירה",
-    "מטבע מכירה",
-    "עמלה (אופציונלי)",
-    "מטבע עמלה (אופציונלי)",
-    "זירה",
-    "אסמכתא (אופציונלי)",
-    "תאריך",
-)
-trade0 = (
-    "Date",
-    "Market",
-    "Category",
-    "Type",
-    "Price",
-    "Amount",
-    "Total",
-    "Fee",
-    "Order Number",
-    "Base Total Less Fee",
-    "Quote Total Less Fee",
-)
+ParsedActions = namedtuple("ParsedActions", "actions, unparsed")
 
-trade1 = (
-    "Date",
-    "Market",
-    "Category",
-    "Type",
-    "Price",
-    "Amount",
-    "Total",
-    "Fee",
-    "Order Number",
-    "Base Total Less Fee",
-    "Quote Total Less Fee",
-    "Fee Currency",
-    "Fee Total",
-)
+# CEX actions executed more than this long after their order are not matched to it
+MATCH_WINDOW = datetime.timedelta(days=30)
 
-trades0 = (
-    "Date (UTC)",
-    "Instrument",
-    "Trade ID",
-    "Order ID",
-    "Side",
-    "Quantity",
-    "Price",
-    "Volume",
-    "Fee",
-    "Rebate",
-    "Total",
-)
 
-idex0 = (
-    "Date",
-    "Type",
-    "Asset",
-    "Name",
-    "Amount",
-    "Status",
-)
+def transform_date(col: pd.Series, date_format: str = None):
+    """Transforms a Series containing datetime data to the
+    acceptable format.
 
-idex1 = (
-    'transactionId',
-    'transactionHash',
-    'date',
-    'market',
-    'makerOrTaker',
-    'buyOrSell',
-    'tokenAmount',
-    'etherAmount',
-    'usdValue',
-    'fee',
-    'gasFee',
-    'feesPaidIn',
-)
+    Each unique value is parsed only once, using the given format if
+    there's one, and the results are mapped back to the whole column.
+    Values that don't match the format are parsed by pandas' inference.
+    """
+    codes, parsed = _parse_unique_dates(col, date_format)
+    formatted = np.append(_format_utc_dates(parsed), np.nan)
+    return pd.Series(formatted[codes], index=col.index, name=col.name)
 
 
-def identify_table_origin(columns):
-    return table_origin[tuple(columns.to_list())]
+def _parse_unique_dates(col: pd.Series, date_format: str = None):
+    """Parses each unique date of the column, returning the code of each
+    row's date (-1 if it's missing) and the parsed dates.
+    """
+    codes, uniques = pd.factorize(col)
+    if date_format is not None:
+        try:
+            return codes, pd.to_datetime(uniques, format=date_format, utc=True)
+        except (ValueError, TypeError):
+            pass
+    return codes, pd.to_datetime(uniques, utc=True)
 
 
-def transform_date(col: pd.Series):
-    """Transforms a Series containing datetime data to the
-    acceptable format.
+def _format_utc_dates(dates: pd.DatetimeIndex) -> np.ndarray:
+    """Formats UTC dates as DATETIME_FORMAT does, building the strings
+    with array operations instead of calling strftime on each date.
     """
-    return pd.to_datetime(col, utc=True).dt.strftime(DATETIME_FORMAT)
+    as_strings = np.datetime_as_string(
+        dates.tz_convert(None).to_numpy().astype("datetime64[s]"), unit="s"
+    )
+    chars = np.empty((len(dates), 25), dtype="U1")
+    chars[:, :19] = as_strings.astype("U19").view("U1").reshape(-1, 19)
+    chars[:, 10] = " "
+    chars[:, 19:] = list(" +0000")
+    formatted = chars.view("U25").ravel().astype(object)
+    formatted[dates.isna()] = np.nan
+    return formatted
 
 
 def convert_idex0(data):
     raise NotImplementedError
-    data["Date"] = transform_date(data["Date"])
+    data["Date"] = transform_date(data["Date"], table_origin[idex0].date_format)
     data = data.loc[data.loc[:, "Status" == "COMPLETE"], :]
     renaming = {"Type": "Action", "Amount": "Volume", "Asset": "Symbol"}
 
 
 def convert_idex1(data):
-    data["date"] = transform_date(data["date"])
+    data["date"] = transform_date(data["date"], table_origin[idex1].date_format)
     renaming = {
         "date": "Date",
         "buyOrSell": "Action",
@@ -259,13 +106,14 @@ def convert_idex1(data):
     }
     renamed = data.rename(columns=renaming)
     renamed['Action'] = renamed['Action'].str.upper()
-    renamed["Symbol"] = renamed["market"].str.split("/", expand=True)[0]
-    renamed["Currency"] = renamed["market"].str.split("/", expand=True)[1]
+    renamed["Symbol"], renamed["Currency"] = split_markets(renamed["market"])
     return renamed
 
 
 def convert_binance0(data):
-    data["Date(UTC)"] = transform_date(data["Date(UTC)"])
+    data["Date(UTC)"] = transform_date(
+        data["Date(UTC)"], table_origin[binance0].date_format
+    )
     renaming = {
         "Date(UTC)": "Date",
         "Type": "Action",
@@ -278,7 +126,7 @@ def convert_binance0(data):
 
 
 def convert_bit2c0(data):
-    data["Date"] = transform_date(data["Date"])
+    data["Date"] = transform_date(data["Date"], table_origin[bit2c0].date_format)
     renaming = {"firstCoin": "Symbol"}
     renamed = data.rename(columns=renaming)
     renamed["Action"] = renamed["Action"].str.upper()
@@ -287,7 +135,7 @@ def convert_bit2c0(data):
 
 def convert_bit2c1(data):
     """First coin-second coin"""
-    data["Date"] = transform_date(data["created"])
+    data["Date"] = transform_date(data["created"], table_origin[bit2c1].date_format)
     renaming = {
         "accountAction": "Action",
         "firstCoin": "Symbol",
@@ -303,7 +151,7 @@ def convert_bit2c1(data):
 
 def convert_bitfinex0(data):
     """Action? PAIR"""
-    data["Date"] = transform_date(data["DATE"])
+    data["Date"] = transform_date(data["DATE"], table_origin[bitfinex0].date_format)
     renaming = {
         "AMOUNT": "Volume",
         "PRICE": "Price",
@@ -311,8 +159,7 @@ def convert_bitfinex0(data):
         "FEE CURRENCY": "FeeCurrency",
     }
     renamed = data.rename(columns=renaming)
-    renamed["Symbol"] = renamed["PAIR"].str.split(pat="/", expand=True)[0]
-    renamed["Currency"] = renamed["PAIR"].str.split(pat="/", expand=True)[1]
+    renamed["Symbol"], renamed["Currency"] = split_markets(renamed["PAIR"])
     renamed["Action"] = ""
     renamed.loc[(renamed["Volume"] > 0), "Action"] = "BUY"
     renamed.loc[(renamed["Volume"] < 0), "Action"] = "SELL"
@@ -323,7 +170,7 @@ def convert_bitfinex0(data):
 
 def convert_bittrex0(data):
     """LIMIT_SELL, EXCHANGE, PricePerUnit"""
-    data["Date"] = transform_date(data["TimeStamp"])
+    data["Date"] = transform_date(data["TimeStamp"], table_origin[bittrex0].date_format)
     renaming = {
         "Quantity": "Volume",
         "Commision": "Fee",
@@ -331,8 +178,9 @@ def convert_bittrex0(data):
         "PricePerUnit": "Price",
     }
     renamed = data.rename(columns=renaming)
-    renamed["Symbol"] = renamed["Exchange"].str.split("-", expand=True)[1]
-    renamed["Currency"] = renamed["Exchange"].str.split("-", expand=True)[0]
+    renamed["Symbol"], renamed["Currency"] = split_markets(
+        renamed["Exchange"], "quote-base"
+    )
     renamed["Action"] = renamed["OrderType"].str.split("_", expand=True)[1]
     return renamed
 
@@ -353,7 +201,7 @@ def convert_cex0(data):
     Finally we'll also add the fee of a transaction based on the
     fee row which is sometimes present.
     """
-    data["Date"] = transform_date(data["DateUTC"])
+    data["Date"] = transform_date(data["DateUTC"], table_origin[cex0].date_format)
     buy_orders = data["Comment"].str.contains("Buy Order")
     buy_orders = data.loc[buy_orders, :]
     sell_orders = data["Comment"].str.contains("Sell Order")
@@ -388,6 +236,11 @@ def _process_cex_order_action_pair(orders, actions, name, fees):
     It does so by try to sum up all actions that - if summed -
     result in an amount similar to the one describe in the parent
     order.
+
+    The orders and actions are turned into NumPy arrays once. The actions
+    are sorted by date so the window of each order is found by a binary
+    search, actions which were already assigned to an order are masked
+    out, and the converted rows are written into preallocated columns.
     """
     dtypes = {
         "Date": "datetime64[ns]",
@@ -400,103 +253,88 @@ def _process_cex_order_action_pair(orders, actions, name, fees):
         "Fee": np.float64,
         "FeeCurrency": object,
     }
-    df = pd.DataFrame(
-        [],
-        columns=[
-            "Date",
-            "Action",
-            "Symbol",
-            "Volume",
-            "Currency",
-            "Account",
-            "Price",
-            "Fee",
-            "FeeCurrency",
-        ],
-    ).astype(dtypes)
+    actions, unparsed = _create_processed_actions_df(actions, name)
+    if len(unparsed) > 0:
+        raise UnparsedActions(unparsed)
+
+    action_dates = pd.DatetimeIndex(pd.to_datetime(actions["Date"], utc=True)).asi8
+    by_date = np.argsort(action_dates, kind="stable")
+    expected = actions["expected"].to_numpy(np.float64)
+    volumes_in_coins = actions["order_volume_in_coins"].to_numpy(np.float64)
+    currency_prices = actions["currency_price"].to_numpy(np.float64)
+    parsed_symbols = actions["parsed_symbol"].to_numpy(object)
+    parsed_currencies = actions["parsed_currency"].to_numpy(object)
+    alive = np.ones(len(actions), dtype=bool)
+
+    order_dates = pd.DatetimeIndex(pd.to_datetime(orders["Date"], utc=True)).asi8
+    order_amounts = np.abs(orders["Amount"].to_numpy(np.float64))
+    order_numbers = orders["Comment"].str.extract(r" #(\d+)", expand=False)
+    order_numbers = order_numbers.to_numpy(object)
+    order_in_coins = (orders["Symbol"] != "USD").to_numpy()
+    first_candidate = np.searchsorted(action_dates[by_date], order_dates, "left")
+    last_candidate = np.searchsorted(
+        action_dates[by_date], order_dates + pd.Timedelta(MATCH_WINDOW).value, "right"
+    )
 
-    number_regex = re.compile(" #(\d+)")
-    new_df = []
-    row_index = 0
-    actions = _create_processed_actions_df(actions.copy(), name)
-    while len(orders) > 0:
-        current_order = orders.head(1)
-        orders = orders.drop(current_order.index)
-        order_amount = np.abs(current_order["Amount"].iloc[0])
-        order_number = number_regex.findall(current_order["Comment"].iloc[0])[0]
-        order_volume_in_coins = (
-            abs(order_amount) if current_order["Symbol"].iloc[0] != "USD" else 0
+    num_of_orders = len(orders)
+    symbols = np.empty(num_of_orders, dtype=object)
+    currencies = np.empty(num_of_orders, dtype=object)
+    volumes = np.where(order_in_coins, order_amounts, 0.0)
+    prices = np.zeros(num_of_orders, dtype=np.float64)
+    fee_amounts = np.zeros(num_of_orders, dtype=np.float64)
+    fee_currencies = np.full(num_of_orders, "", dtype=object)
+    for row in range(num_of_orders):
+        order_amount = order_amounts[row]
+        window = by_date[first_candidate[row] : last_candidate[row]]
+        later_actions = np.sort(window[alive[window]])
+        identical_action_to_order = find_single_action(
+            expected[later_actions], order_amount
         )
-        later_actions = actions.loc[actions["Date"] >= current_order["Date"].iloc[0], :]
-        average_price_of_actions = 0
-        identical_action_to_order = later_actions.loc[
-            np.isclose(later_actions.loc[:, "expected"], [order_amount], 0.01, 0.001)
-        ]
         if len(identical_action_to_order) == 1:
-            actions_of_order = identical_action_to_order.index
-            average_price_of_actions = identical_action_to_order.loc[
-                actions_of_order[0], "currency_price"
-            ]
-            symbol = identical_action_to_order.loc[actions_of_order[0], "parsed_symbol"]
-            currency = identical_action_to_order.loc[
-                actions_of_order[0], "parsed_currency"
-            ]
-            order_volume_in_coins += identical_action_to_order.loc[
-                actions_of_order[0], "order_volume_in_coins"
-            ]
+            actions_of_order = later_actions[identical_action_to_order]
         elif len(identical_action_to_order) >= 2:
             raise AssertionError(
-                f"Two or more transactions found that could be assigned to order {current_order}. Exiting."
+                f"Two or more transactions found that could be assigned to order {orders.iloc[[row]]}. Exiting."
             )
         # Case of no one-to-one correspondence between order and action
         else:
-            pair_found = False
-            for number_of_items_per_group in range(2, 20):
-                if pair_found:
-                    break
-                combs = combinations(later_actions.index, number_of_items_per_group)
-                for comb in combs:
-                    current_pair = later_actions.loc[comb, :]
-                    if np.isclose(
-                        [current_pair.loc[:, "expected"].sum()],
-                        [order_amount],
-                        0.01,
-                        0.01,
-                    ).all():
-                        pair_found = True
-                        break
-            else:
+            try:
+                group = find_action_group(
+                    expected[later_actions],
+                    order_amount,
+                    distances=action_dates[later_actions] - order_dates[row],
+                )
+            except TooManyCandidates as e:
+                raise TooManyCandidates(f"{e} Order: {orders.iloc[[row]]}") from e
+            if group is None:
                 raise AssertionError(
-                    f"More than 20 lines were needed to find all transactions of order {current_order}. Exiting."
+                    f"More than 20 lines were needed to find all transactions of order {orders.iloc[[row]]}. Exiting."
                 )
-            # We're found a pair (or a triplet) of transactions that together make up one
-            # order. We'll now parse its parameters.
-
-            actions_of_order = current_pair.index
-            average_price_of_actions = current_pair.loc[:, "currency_price"].mean()
-            order_volume_in_coins += current_pair.loc[:, "order_volume_in_coins"].sum()
-            symbol = current_pair.loc[actions_of_order[0], "parsed_symbol"]
-            currency = current_pair.loc[actions_of_order[0], "parsed_currency"]
-        df_of_order = {}
-        df_of_order["Date"] = current_order["Date"].iloc[0]
-        df_of_order["Action"] = current_order["Type"].iloc[0].upper()
-        df_of_order["Symbol"] = symbol
-        df_of_order["Volume"] = order_volume_in_coins
-        df_of_order["Currency"] = currency
-        df_of_order["Account"] = "CEX"
-        df_of_order["Price"] = average_price_of_actions / len(actions_of_order)
+            actions_of_order = later_actions[group]
+        average_price_of_actions = currency_prices[actions_of_order].mean()
+        prices[row] = average_price_of_actions / len(actions_of_order)
+        volumes[row] += volumes_in_coins[actions_of_order].sum()
+        symbols[row] = parsed_symbols[actions_of_order[0]]
+        currencies[row] = parsed_currencies[actions_of_order[0]]
         try:
-            df_of_order["Fee"] = fees[order_number][0]
+            fee_amounts[row], fee_currencies[row] = fees[order_numbers[row]]
         except KeyError:
-            df_of_order["Fee"] = 0
-            df_of_order["FeeCurrency"] = ""
-        else:
-            df_of_order["FeeCurrency"] = fees[order_number][1]
-        df = pd.DataFrame(df_of_order, index=[row_index]).astype(dtypes)
-        new_df.append(df)
-        actions = actions.drop(actions_of_order, axis=0)
-        row_index += 1
-    return pd.concat(new_df, ignore_index=True)
+            pass
+        alive[actions_of_order] = False
+
+    return pd.DataFrame(
+        {
+            "Date": orders["Date"].to_numpy(),
+            "Action": orders["Type"].str.upper().to_numpy(),
+            "Symbol": symbols,
+            "Volume": volumes,
+            "Currency": currencies,
+            "Account": "CEX",
+            "Price": prices,
+            "Fee": fee_amounts,
+            "FeeCurrency": fee_currencies,
+        }
+    ).astype(dtypes)
 
 
 def _turn_fees_to_dict(fees):
@@ -512,57 +350,47 @@ def _turn_fees_to_dict(fees):
     return fees_dict
 
 
-def _create_processed_actions_df(actions, name):
+def _create_processed_actions_df(actions, name) -> ParsedActions:
     """Generates a more robust and useful actions DataFrame,
     containing the needed information for each action in an easy-to-use format.
     It's useful since it will speed up its iteration and parsing later on.
+
+    All comments are parsed at once with a single pattern. Actions whose
+    comment doesn't match it are returned separately, together with the
+    reason they were rejected, and aren't part of the parsed actions.
     """
-    symbol_price_regex = re.compile(f"{name} ([\d\.]+) [A-Z]+ at")
-    currency_price_regex = re.compile(" at ([\d\.]+) [A-Z]+")
-    currency_name_regex = re.compile(" at [\d\.]+ ([A-Z]+)")
-    symbol_name_regex = re.compile(f"{name} [\d\.]+ ([A-Z]+) at")
-    added_data = []
-    new_columns = [
-        ("expected", np.float64(0.0)),
-        ("order_volume_in_coins", np.float64(0.0)),
-        ("parsed_currency", ""),
-        ("parsed_symbol", ""),
-        ("currency_price", 0.0),
-    ]
-    for col in new_columns:
-        actions.loc[:, col[0]] = col[1]
-
-    for index, action in actions.iterrows():
-        added_columns = {}
-        currency_price = float(currency_price_regex.findall(action["Comment"])[0])
-        symbol_amount = float(symbol_price_regex.findall(action["Comment"])[0])
-        if action["Symbol"] == "USD":
-            expected_amount = symbol_amount
-        else:
-            expected_amount = symbol_amount * currency_price
-        added_columns["expected"] = expected_amount
-        if action["Symbol"] != "USD":
-            order_volume_in_coins = action["Amount"]
-        else:
-            order_volume_in_coins = 0
-        added_columns["order_volume_in_coins"] = order_volume_in_coins
-        currency = currency_name_regex.findall(action["Comment"])[0]
-        symbol = symbol_name_regex.findall(action["Comment"])[0]
-        added_columns["parsed_currency"] = currency
-        added_columns["parsed_symbol"] = symbol
-        added_columns["currency_price"] = currency_price
-        added_data.append((pd.DataFrame(added_columns.copy(), index=[index])))
+    action_regex = (
+        f"{name} (?P<symbol_amount>[\\d\\.]+) (?P<parsed_symbol>[A-Z]+)"
+        " at (?P<currency_price>[\\d\\.]+) (?P<parsed_currency>[A-Z]+)"
+    )
+    parsed = actions["Comment"].astype(str).str.extract(action_regex)
+    symbol_amount = pd.to_numeric(parsed["symbol_amount"], errors="coerce")
+    currency_price = pd.to_numeric(parsed["currency_price"], errors="coerce")
+    unmatched = parsed.isna().any(axis=1)
+    unparsable = ~unmatched & (symbol_amount.isna() | currency_price.isna())
+    unparsed = actions.loc[unmatched | unparsable, ["Comment"]].copy()
+    unparsed["Reason"] = np.where(
+        unmatched[unparsed.index], "unknown comment format", "invalid number"
+    )
 
-    for datum in added_data:
-        actions.update(datum)
-    return actions
+    is_usd = actions["Symbol"] == "USD"
+    actions = actions.assign(
+        expected=symbol_amount.where(is_usd, symbol_amount * currency_price),
+        order_volume_in_coins=actions["Amount"].where(~is_usd, 0.0).astype(
+            np.float64
+        ),
+        parsed_currency=parsed["parsed_currency"],
+        parsed_symbol=parsed["parsed_symbol"],
+        currency_price=currency_price,
+    )
+    return ParsedActions(actions.drop(unparsed.index), unparsed)
 
 
 def convert_exodus0(data):
     """OUTAMOUNT INAMOUNT only withdrawals and deposits"""
     raise NotImplementedError
     data["Date"] = data["DATE"].str.split("(", expand=True)[0]
-    data["Date"] = transform_date(data["Date"])
+    data["Date"] = transform_date(data["Date"], table_origin[exodus0].date_format)
     renaming = {
         "TYPE": "Action",
         "OUTAMOUNT": "Volume",
@@ -578,51 +406,70 @@ def convert_exodus0(data):
 
 
 def convert_ledgers0(data):
-    """What is the "amount" of the second row of each trade?"""
-    parsed = []
-    converted_row = pd.DataFrame([np.arange(len(all_columns))], columns=all_columns)
-    for _, trade in data.groupby("refid"):
-        if len(trade) != 2:
-            continue
-        if trade["type"].iloc[0] != "trade":
-            continue
-        converted_row["Date"] = transform_date(trade.loc[:, "time"]).iloc[0]
-        coin_names = trade.loc[:, "asset"].str[1:].replace("XBT", "BTC")
-        converted_row["Currency"] = coin_names.iloc[1]
-        converted_row["FeeCurrency"] = coin_names.iloc[1]
-        converted_row["Symbol"] = coin_names.iloc[0]
-        converted_row["Action"] = "SELL" if trade.iloc[0, 6] < 0 else "BUY"
-        converted_row["Volume"] = np.abs(trade.loc[:, "amount"].iloc[0])
-        converted_row["Total"] = np.abs(trade.loc[:, "amount"].iloc[1])
-        converted_row["Fee"] = trade.loc[:, "fee"].iloc[1]
-        converted_row["Price"] = converted_row["Total"] / converted_row["Volume"]
-        converted_row["Account"] = "Kraken"
-        parsed.append(converted_row.copy())
-
-    return pd.concat(parsed)
+    """What is the "amount" of the second row of each trade?
+
+    Every trade is made of two "trade" rows sharing a refid. These are
+    pivoted side by side so that each trade becomes a single row, and
+    all of the output columns are computed on whole columns at once.
+    """
+    is_trade = data["type"] == "trade"
+    by_refid = is_trade.groupby(data["refid"])
+    legs_of_trade = by_refid.transform("size")
+    trade_legs = by_refid.transform("sum")
+    trades = data.loc[(legs_of_trade == 2) & (trade_legs == 2), :]
+    leg = trades.groupby("refid").cumcount()
+    trades = trades.assign(leg=leg).pivot(
+        index="refid", columns="leg", values=["time", "asset", "amount", "fee"]
+    )
+    # Kraken's asset names, like XXBT, are normalized with the other formats'
+    coin_names = trades["asset"]
+    converted = pd.DataFrame(index=range(len(trades)), columns=all_columns)
+    converted["Date"] = transform_date(
+        trades["time"][0], table_origin[ledgers0].date_format
+    ).to_numpy()
+    converted["Action"] = np.where(trades["amount"][0] < 0, "SELL", "BUY")
+    converted["Symbol"] = coin_names[0].to_numpy()
+    converted["Volume"] = np.abs(trades["amount"][0].to_numpy(np.float64))
+    converted["Currency"] = coin_names[1].to_numpy()
+    converted["Account"] = "Kraken"
+    converted["Total"] = np.abs(trades["amount"][1].to_numpy(np.float64))
+    converted["Price"] = converted["Total"] / converted["Volume"]
+    converted["Fee"] = trades["fee"][1].to_numpy(np.float64)
+    converted["FeeCurrency"] = converted["Currency"]
+    return converted
 
 
 def convert_lqui0(data):
-    data["Date"] = transform_date(data["Date"])
+    data["Date"] = transform_date(data["Date"], table_origin[lqui0].date_format)
     renaming = {"Type": "Action", "Amount": "Volume"}
     renamed = data.rename(columns=renaming)
-    renamed["Symbol"] = renamed["Market"].str.split("/", expand=True)[0]
-    renamed["Currency"] = renamed["Market"].str.split("/", expand=True)[1]
-    renamed["Fee"] = renamed["Fee"].str[:-1]
+    renamed["Symbol"], renamed["Currency"] = split_markets(renamed["Market"])
+    if renamed["Fee"].dtype == object:  # Not parsed by the read schema
+        renamed["Fee"] = pd.to_numeric(renamed["Fee"].str.rstrip("%"))
     return renamed
 
 
 def convert_member0(data):
-    data["Date"] = transform_date(data["DATE"])
+    data["Date"] = transform_date(data["DATE"], table_origin[member0].date_format)
     renaming = {"PRICE": "Price", "FEE": "Fee", "FEECURRENCY": "FeeCurrency"}
     renamed = data.rename(columns=renaming)
     renamed["Action"] = renamed["Action"].str.upper()
     return renamed
 
 
-def convert_shapeshift0(data):
-    """Uses and external API to calculate the Price"""
-    data["Date"] = transform_date(data["תאריך"])
+def convert_shapeshift0(data, max_workers: int = None):
+    """Looks the Price up in the local price store, and uses an external
+    API to calculate the prices it doesn't have, with at most max_workers
+    concurrent requests.
+
+    Either way, the coins' prices are those of the opening of the trade's
+    (UTC) day, which is when the API's first trade of the day was made.
+    """
+    codes, parsed = _parse_unique_dates(
+        data["תאריך"], table_origin[shapeshift0].date_format
+    )
+    data["Date"] = np.append(_format_utc_dates(parsed), np.nan)[codes]
+    day_starts = np.append(parsed.floor("D").asi8, np.iinfo(np.int64).min)[codes]
     renaming = {
         "כמות רכישה": "Volume",
         "מטבע רכישה": "Symbol",
@@ -637,41 +484,31 @@ def convert_shapeshift0(data):
     renamed["Action"] = "BUY"
     renamed["Fee"] = 0.01 * renamed["Volume"]
     renamed["FeeCurrency"] = renamed["Symbol"]
-    prices = []
-    for index, row in renamed.iterrows():
-        symbol_rate = _get_coin_conversion_rate(row["Symbol"], row["Date"])
-        currency_rate = _get_coin_conversion_rate(row["Currency"], row["Date"])
-        price = symbol_rate / currency_rate
-        prices.append(price)
-    renamed["Price"] = prices
-    return renamed
+    coins = pd.concat([renamed["Symbol"], renamed["Currency"]], ignore_index=True)
+    dates = pd.concat([renamed["Date"], renamed["Date"]], ignore_index=True)
+    from price_store import default_store
 
+    rates = default_store().lookup(coins, np.tile(day_starts, 2))
+    missing = np.isnan(rates)
+    if missing.any():
+        from rate_fetcher import resolve_rates
 
-def _get_coin_conversion_rate(coin: str, date: datetime.datetime) -> float:
-    """Returns the conversion rate of the given coin to USD,
-    as found from Bitfinex's API in the given date.
-    """
-    bitfinex_url = "https://api-pub.bitfinex.com/v2/trades/t{}USD/hist"
-    coin = coin.upper()
-    date = int(pd.to_datetime(date).timestamp() * 1000.0)
-    params = {"limit": 1, "start": date, "end": date + 86400000, "sort": 1}
-    try:
-        r = requests.get(bitfinex_url.format(coin), params=params)
-        r.raise_for_status()
-    except requests.HTTPError:
-        raise
-    else:
-        return r.json()[0][3]
+        rates[missing] = resolve_rates(
+            coins[missing], dates[missing], max_workers=max_workers
+        )
+    symbol_rates, currency_rates = np.split(rates, 2)
+    renamed["Price"] = symbol_rates / currency_rates
+    return renamed
 
 
 def convert_trade0(data):
-    data["Date"] = transform_date(data["Date"])
+    data["Date"] = transform_date(data["Date"], table_origin[trade0].date_format)
     renaming = {"Type": "Action", "Amount": "Volume"}
     renamed = data.rename(columns=renaming)
     renamed["Action"] = renamed["Action"].str.upper()
-    renamed["Fee"] = renamed["Fee"].str[:-1]
-    renamed["Symbol"] = renamed["Market"].str.split("/", expand=True)[0]
-    renamed["Currency"] = renamed["Market"].str.split("/", expand=True)[1]
+    if renamed["Fee"].dtype == object:  # Not parsed by the read schema
+        renamed["Fee"] = pd.to_numeric(renamed["Fee"].str.rstrip("%"))
+    renamed["Symbol"], renamed["Currency"] = split_markets(renamed["Market"])
     return renamed
 
 
@@ -684,32 +521,10 @@ def convert_trade1(data):
 
 def convert_trades0(data):
     """Rebate? Total? Quantity?"""
-    data["Date"] = transform_date(data["Date (UTC)"])
+    data["Date"] = transform_date(data["Date (UTC)"], table_origin[trades0].date_format)
     renaming = {"Side": "Action", "Quantity": "Volume", "Volume": "TotalBeforeFee"}
     renamed = data.rename(columns=renaming)
-    renamed["Symbol"] = renamed["Instrument"].str.split("/", expand=True)[0]
-    renamed["Currency"] = renamed["Instrument"].str.split("/", expand=True)[1]
+    renamed["Symbol"], renamed["Currency"] = split_markets(renamed["Instrument"])
     renamed["Action"] = renamed["Action"].str.upper()
     renamed["Fee"] += renamed["Rebate"]
     return renamed
-
-
-table_origin = {
-    binance0: convert_binance0,
-    bit2c0: convert_bit2c0,
-    bit2c1: convert_bit2c1,
-    bit2c2: convert_bit2c1,
-    bitfinex0: convert_bitfinex0,
-    bittrex0: convert_bittrex0,
-    cex0: convert_cex0,
-    exodus0: convert_exodus0,
-    ledgers0: convert_ledgers0,
-    lqui0: convert_lqui0,
-    member0: convert_member0,
-    shapeshift0: convert_shapeshift0,
-    trade0: convert_trade0,
-    trade1: convert_trade1,
-    trades0: convert_trades0,
-    idex0: convert_idex0,
-    idex1: convert_idex1,
-}
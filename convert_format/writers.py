@@ -0,0 +1,165 @@
+"""
+This module writes the converted tables, as CSV or in one of Arrow's
+columnar formats.
+
+The columnar formats keep the columns' types, so downstream tools read
+them back without parsing. They can also be written as a dataset which is
+partitioned by the account and the year of the trades, where every
+conversion adds new files and never rewrites the existing ones.
+"""
+import pathlib
+import uuid
+
+import pandas as pd
+
+from csv_writer import write_csv
+from formats import ISO_FORMAT, all_columns
+from symbols import is_text_categorical
+
+
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+COLUMNAR_FORMATS = ("parquet", "arrow")
+STRING_COLUMNS = ("Action", "Symbol", "Currency", "Account", "FeeCurrency")
+FLOAT_COLUMNS = ("Volume", "Total", "Price", "Fee")
+YEAR_COLUMN = "year"
+PARTITION_COLUMNS = ("Account", YEAR_COLUMN)
+# The directory of missing accounts, which is read back as a missing value
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def output_schema():
+    """Returns the Arrow schema of the converted tables."""
+    import pyarrow as pa
+
+    types = {"Date": pa.timestamp("us", tz="UTC")}
+    types.update({column: pa.string() for column in STRING_COLUMNS})
+    types.update({column: pa.float64() for column in FLOAT_COLUMNS})
+    return pa.schema([(column, types[column]) for column in all_columns])
+
+
+def to_arrow(data: pd.DataFrame):
+    """Converts a converted table to an Arrow table of the output schema.
+    Raises ValueError or TypeError if a column doesn't fit its type.
+    """
+    import pyarrow as pa
+
+    columns = {"Date": _parse_dates(data["Date"])}
+    for column in STRING_COLUMNS:
+        values = data[column]
+        if is_text_categorical(values):
+            # Arrow casts the categories, rather than each row's value
+            columns[column] = values
+            continue
+        values = values.astype(object)
+        # Turns stray numbers into strings, keeping the missing values
+        columns[column] = values.where(values.isna(), values.astype(str))
+    for column in FLOAT_COLUMNS:
+        columns[column] = pd.to_numeric(data[column]).astype("float64")
+    columns = pd.DataFrame(columns, columns=all_columns)
+    return pa.Table.from_pandas(columns, schema=output_schema(), preserve_index=False)
+
+
+def _parse_dates(dates: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        # CEX's converter keeps its (UTC) timestamps
+        parsed = dates
+    else:
+        # The converters format the other dates in UTC as DATETIME_FORMAT, so
+        # the offset is dropped for pandas' fast path instead of being parsed
+        without_offset = dates.astype(object).str.slice(0, 19)
+        parsed = pd.to_datetime(without_offset, format=ISO_FORMAT)
+    if parsed.dt.tz is None:
+        return parsed.dt.tz_localize("UTC")
+    return parsed.dt.tz_convert("UTC")
+
+
+class TableWriter:
+    """Writes a converted table to a file, a chunk at a time.
+
+    With ``partitioned`` the path is the root of a dataset, in which each
+    chunk is written to a new file named after ``name`` under a
+    ``Account=<account>/year=<year>`` directory. With ``append`` the rows
+    are added to an existing CSV file.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        output_format: str = "csv",
+        partitioned: bool = False,
+        name: str = "part",
+        append: bool = False,
+    ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if partitioned and output_format not in COLUMNAR_FORMATS:
+            raise ValueError("Only the columnar formats can be partitioned.")
+        self.path = pathlib.Path(path)
+        self.output_format = output_format
+        self.partitioned = partitioned
+        # Unique per conversion, so that appending never overwrites a file
+        self.name = f"{name}-{uuid.uuid4().hex[:12]}"
+        self.chunks = 0
+        self._writer = None
+        if append and output_format != "csv":
+            raise ValueError("Only CSV files can be appended to.")
+        if output_format == "csv" and not (append and self.path.exists()):
+            pd.DataFrame(columns=all_columns).to_csv(self.path, index=False)
+
+    def write(self, data: pd.DataFrame):
+        """Appends the rows of the converted table."""
+        if self.output_format == "csv":
+            write_csv(data, self.path)
+        elif self.partitioned:
+            self._write_partitions(to_arrow(data))
+        else:
+            table = to_arrow(data)
+            if self._writer is None:
+                self._writer = self._open(table.schema)
+            self._writer.write_table(table)
+        self.chunks += 1
+
+    def close(self):
+        if self.output_format in COLUMNAR_FORMATS and not self.partitioned:
+            if self._writer is None:
+                # A table without rows is still written, with its schema
+                self._writer = self._open(output_schema())
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open(self, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.output_format == "parquet":
+            return pq.ParquetWriter(self.path, schema)
+        return pa.ipc.new_file(str(self.path), schema)
+
+    def _write_partitions(self, table):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        years = pc.year(table.column("Date")).cast(pa.int32())
+        table = table.append_column(YEAR_COLUMN, years)
+        # Arrow doesn't group missing partition values, making a directory
+        # per row instead
+        position = table.schema.get_field_index("Account")
+        accounts = pc.fill_null(table.column(position), HIVE_NULL_PARTITION)
+        table = table.set_column(position, "Account", accounts)
+        fields = [table.schema.field(column) for column in PARTITION_COLUMNS]
+        partitioning = ds.partitioning(pa.schema(fields), flavor="hive")
+        suffix = OUTPUT_FORMATS[self.output_format]
+        ds.write_dataset(
+            table,
+            self.path,
+            format="parquet" if self.output_format == "parquet" else "ipc",
+            partitioning=partitioning,
+            basename_template=f"{self.name}-{self.chunks}-{{i}}{suffix}",
+            existing_data_behavior="overwrite_or_ignore",
+        )
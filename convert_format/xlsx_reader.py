@@ -0,0 +1,112 @@
+"""
+A streaming reader of .xlsx sheets.
+
+The sheet is opened in openpyxl's read-only mode and its rows are parsed
+lazily, so the cells of a whole workbook are never held in memory at once
+and a sheet can be read in chunks. The cells are converted the way
+pd.read_excel() converts them, so both readers return the same table.
+"""
+import itertools
+import pathlib
+from typing import Iterator
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+
+EMPTY_CELL = ""
+
+
+def iter_rows(fname: pathlib.Path) -> Iterator[list]:
+    """Yields the rows of the file's first sheet as lists of values.
+
+    Empty cells are empty strings and error cells are NaN. Trailing empty
+    cells and rows are dropped, and rows shorter than the header are padded.
+    """
+    # openpyxl is only needed for Excel files
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import ERROR_CODES
+
+    book = load_workbook(fname, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book.worksheets[0]
+        # Some writers store wrong dimensions, which truncate read-only sheets
+        sheet.reset_dimensions()
+        width = 0
+        empty_rows = 0
+        for values in sheet.iter_rows(values_only=True):
+            row = [_convert_value(value, ERROR_CODES) for value in values]
+            while row and row[-1] == EMPTY_CELL:
+                row.pop()
+            if not row:
+                # Held back until a row with data shows they aren't trailing
+                empty_rows += 1
+                continue
+            width = width or len(row)
+            for _ in range(empty_rows):
+                yield [EMPTY_CELL] * width
+            empty_rows = 0
+            if len(row) < width:
+                row.extend([EMPTY_CELL] * (width - len(row)))
+            yield row
+    finally:
+        book.close()
+
+
+def _convert_value(value, error_codes):
+    if value is None:
+        return EMPTY_CELL
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    if type(value) is str and value in error_codes:
+        return float("nan")
+    return value
+
+
+def read_columns(fname: pathlib.Path) -> pd.Index:
+    """Reads only the header of the file's first sheet."""
+    rows = iter_rows(fname)
+    header = next(rows, None)
+    rows.close()
+    if header is None:
+        return pd.Index([])
+    return _parse([header], None, None).columns
+
+
+def read_sheet(fname: pathlib.Path, usecols=None, dtype=None) -> pd.DataFrame:
+    """Reads the file's first sheet like pd.read_excel()."""
+    return _parse(list(iter_rows(fname)), usecols, dtype)
+
+
+def read_sheet_chunks(
+    fname: pathlib.Path, chunksize: int, usecols=None, dtype=None
+) -> Iterator[pd.DataFrame]:
+    """Reads the file's first sheet in chunks of at most chunksize rows.
+    Only the rows of a single chunk are held in memory at a time.
+
+    Like pipeline.read_data(), a chunk whose cells don't fit the dtypes
+    is read untyped.
+    """
+    rows = iter_rows(fname)
+    header = next(rows, None)
+    if header is None:
+        return
+    first_row = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunksize))
+        if not chunk:
+            return
+        try:
+            data = _parse([header] + chunk, usecols, dtype)
+        except (ValueError, TypeError):
+            data = _parse([header] + chunk, usecols, None)
+        data.index += first_row
+        first_row += len(chunk)
+        yield data
+
+
+def _parse(rows: list, usecols, dtype) -> pd.DataFrame:
+    # pd.read_excel() parses its cells with the same parser
+    return TextParser(
+        rows, header=0, usecols=usecols, dtype=dtype, skip_blank_lines=False
+    ).read()
@@ -7,7 +7,7 @@ a = Analysis(['convert_format\\main.py'],
              pathex=['convert_format', 'C:\\Users\\hadar\\Documents\\convert_bitcoin_formats'],
              binaries=[],
              datas=[],
-             hiddenimports=[],
+             hiddenimports=['table_handler'],
              hookspath=[],
              runtime_hooks=[],
              excludes=[],
@@ -19,10 +19,9 @@ pyz = PYZ(a.pure, a.zipped_data,
              cipher=block_cipher)
 exe = EXE(pyz,
           a.scripts,
-          [('v', None, 'OPTION')],
           exclude_binaries=True,
           name='main',
-          debug=True,
+          debug=False,
           bootloader_ignore_signals=False,
           strip=False,
           upx=False,
@@ -0,0 +1,43 @@
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "convert_format"))
+
+import cex_matcher  # noqa: E402
+
+
+def hard_amounts():
+    # Amounts spread over orders of magnitude, of which no group matches the
+    # order, though the scaled reachability check lets the order through
+    return np.random.default_rng(32).lognormal(0, 3, cex_matcher.MAX_CANDIDATES)
+
+
+def test_unmatched_order_is_given_up():
+    amounts, target = hard_amounts(), 2187.798
+    tolerance = 0.01 + 0.01 * target
+    assert cex_matcher._is_reachable(amounts, target - tolerance, target + tolerance)
+    start = time.perf_counter()
+    with pytest.raises(cex_matcher.TooManyCandidates):
+        cex_matcher.find_action_group(amounts, target)
+    assert time.perf_counter() - start < 30
+
+
+def test_group_is_found():
+    amounts = hard_amounts()
+    group = cex_matcher.find_action_group(amounts, amounts[[3, 17, 40]].sum())
+    assert group is not None
+    assert np.isclose(amounts[group].sum(), amounts[[3, 17, 40]].sum(), rtol=0.01)
+
+
+def test_closest_candidates_are_searched():
+    amounts = np.full(100, 150.0)
+    amounts[[80, 90]] = 3.0, 4.0
+    distances = np.arange(100)[::-1]
+    group = cex_matcher.find_action_group(amounts, 7.0, distances=distances)
+    assert group.tolist() == [80, 90]
+    with pytest.raises(cex_matcher.TooManyCandidates):
+        cex_matcher.find_action_group(amounts, 7.0)